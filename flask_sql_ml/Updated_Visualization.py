@@ -1,4 +1,3 @@
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend for Flask
 import matplotlib.pyplot as plt
@@ -6,78 +5,121 @@ import seaborn as sns
 from io import BytesIO
 import base64
 import os
+from dataset_store import DatasetStore
+from partitioned_store import PartitionedStore, normalize_name
+from instrumentation import span
+from charts import pollutant_contribution, draw_pollutant_contribution
 # Get the absolute path of the directory this script is in
 base_dir = os.path.dirname(os.path.abspath(__file__))
 file_path = os.path.join(base_dir, "Final_Dataset.csv")
+# Readings posted to /readings; the dataset CSV itself is never written
+readings_log = os.getenv("READINGS_LOG", os.path.join(base_dir, "instance", "readings.csv"))
+# The city Final_Dataset.csv covers
+DEFAULT_CITY = normalize_name(os.getenv("DEFAULT_CITY", "delhi"))
 
-# Read the dataset
-df = pd.read_csv(file_path)
+# The dataset, read on first use; readings posted to /readings are folded into
+# the store's running aggregates, which the charts below read instead of
+# regrouping df
+store = DatasetStore(file_path, readings_log)
+# Other cities and stations, loaded partition by partition as they are used;
+# the default city is served from the store above
+cities = PartitionedStore()
+cities.register(DEFAULT_CITY, store)
+
+
+def dataset_for(city=None):
+    """The default dataset, or one city's data from the catalog"""
+    return store if city is None else cities.view(city)
 
 # Helper function to convert matplotlib plots to base64 strings
 def plot_to_base64():
     fig = plt.gcf()  # Get current figure
     buf = BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)  # Explicitly close THIS figure only
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
-
-
-def plot_aqi_histogram(month):
-    df_filtered = df[df["month"] == month]
-    aqi_trend = df_filtered.groupby("year")["AQI"].mean()
-
-    plt.figure(figsize=(10, 7))
-    plt.bar(aqi_trend.index, aqi_trend.values, color='b', edgecolor="black")
-    plt.xlabel("Year")
-    plt.ylabel("Average AQI")
-    plt.title(f"Average AQI for Month {month} Across All Years")
-    plt.xticks(aqi_trend.index, rotation=45)
+    with span("render"):
+        fig.savefig(buf, format='png', bbox_inches='tight')
+        plt.close(fig)  # Explicitly close THIS figure only
+    with span("encode"):
+        buf.seek(0)
+        return base64.b64encode(buf.read()).decode('utf-8')
+
+
+def plot_aqi_histogram(month, dataset=None):
+    dataset = store if dataset is None else dataset
+    with span("aggregate"):
+        aqi_trend = dataset.yearly_means(month)
+
+    with span("render"):
+        plt.figure(figsize=(10, 7))
+        plt.bar(aqi_trend.index, aqi_trend.values, color='b', edgecolor="black")
+        plt.xlabel("Year")
+        plt.ylabel("Average AQI")
+        plt.title(f"Average AQI for Month {month} Across All Years")
+        plt.xticks(aqi_trend.index, rotation=45)
 
     return plot_to_base64()
 
-def plot_pollutant_contribution(month):
-    df_filtered = df[df["month"] == month]
-    pollutant_columns = [col for col in df.columns if col not in ["year", "month", "AQI"]]
-    df_filtered.loc[:, pollutant_columns] = df_filtered[pollutant_columns].apply(pd.to_numeric, errors='coerce')
-
-    pollutant_sums = df_filtered[pollutant_columns].sum()
-    pollutant_sums = pollutant_sums[pollutant_sums > 0]
+def plot_pollutant_contribution(month, dataset=None):
+    dataset = store if dataset is None else dataset
+    with span("aggregate"):
+        pollutant_sums = pollutant_contribution(dataset.pollutant_totals(month))
 
     if pollutant_sums.empty:
         return None  # No valid data to plot
 
-    plt.figure(figsize=(8, 8))
-    plt.pie(pollutant_sums, labels=pollutant_sums.index, autopct="%1.1f%%",
-            startangle=140, colors=plt.cm.Paired.colors)
-    plt.title(f"Pollutant Contribution to AQI for Month {month} Across All Years")
+    with span("render"):
+        draw_pollutant_contribution(pollutant_sums, month)
 
     return plot_to_base64()
 
-def plot_aqi_trend(month):
-    df_filtered = df[df["month"] == month]
-    aqi_trend = df_filtered.groupby("year")["AQI"].mean()
-
-    plt.figure(figsize=(10, 5))
-    plt.plot(aqi_trend.index, aqi_trend.values, marker="o", linestyle="-", color="b",
-             label=f"Average AQI for Month {month}")
-    plt.xlabel("Year")
-    plt.ylabel(f"Average AQI in Month {month}")
-    plt.title(f"AQI Trend for Month {month} Across All Years")
-    plt.xticks(aqi_trend.index)
-    plt.grid(True, linestyle="--", alpha=0.6)
-    plt.legend()
+def plot_aqi_trend(month, dataset=None):
+    dataset = store if dataset is None else dataset
+    with span("aggregate"):
+        aqi_trend = dataset.yearly_means(month)
+
+    with span("render"):
+        plt.figure(figsize=(10, 5))
+        plt.plot(aqi_trend.index, aqi_trend.values, marker="o", linestyle="-", color="b",
+                 label=f"Average AQI for Month {month}")
+        plt.xlabel("Year")
+        plt.ylabel(f"Average AQI in Month {month}")
+        plt.title(f"AQI Trend for Month {month} Across All Years")
+        plt.xticks(aqi_trend.index)
+        plt.grid(True, linestyle="--", alpha=0.6)
+        plt.legend()
 
     return plot_to_base64()
 
-def plot_aqi_heatmap(month):
-    df_filtered = df[df["month"] == month]
-    heatmap_data = df_filtered.pivot_table(values="AQI", index="year", aggfunc="mean")
+def plot_aqi_heatmap(month, dataset=None):
+    dataset = store if dataset is None else dataset
+    with span("aggregate"):
+        heatmap_data = dataset.yearly_means(month).to_frame()
 
-    plt.figure(figsize=(8, 6))
-    sns.heatmap(heatmap_data, cmap="coolwarm", annot=True, fmt=".1f", linewidths=0.5)
-    plt.title(f"AQI Heatmap for Month {month} Across All Years")
-    plt.xlabel("Year")
-    plt.ylabel("")
+    with span("render"):
+        plt.figure(figsize=(8, 6))
+        sns.heatmap(heatmap_data, cmap="coolwarm", annot=True, fmt=".1f", linewidths=0.5)
+        plt.title(f"AQI Heatmap for Month {month} Across All Years")
+        plt.xlabel("Year")
+        plt.ylabel("")
 
     return plot_to_base64()
+
+def create_visualizations(month, city=None):
+    """All charts for a month as base64 PNGs, keyed by chart name"""
+    dataset = dataset_for(city)
+    # Generate base64 images directly (they're already base64!)
+    histogram_img = plot_aqi_histogram(month, dataset)
+    trend_img = plot_aqi_trend(month, dataset)
+    heatmap_img = plot_aqi_heatmap(month, dataset)
+    pollutants_img = plot_pollutant_contribution(month, dataset)
+
+    # Only include non-None images (pie chart can return None)
+    visualizations = {}
+    if histogram_img:
+        visualizations["histogram"] = histogram_img
+    if trend_img:
+        visualizations["trend"] = trend_img
+    if heatmap_img:
+        visualizations["heatmap"] = heatmap_img
+    if pollutants_img:
+        visualizations["pollutants"] = pollutants_img
+    return visualizations
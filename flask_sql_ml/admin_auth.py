@@ -0,0 +1,24 @@
+"""Shared-secret checks for the admin-only routes.
+
+Each group of routes has its own token, so handing out the token that can
+post readings does not also open the profiler. A route whose token is not
+configured answers 403 to everyone.
+"""
+import os
+import hmac
+
+from flask import request, jsonify
+
+READINGS_ADMIN_TOKEN = os.getenv("READINGS_ADMIN_TOKEN")
+
+
+def token_valid(token, expected):
+    """True if token matches the configured expected token"""
+    return bool(expected) and hmac.compare_digest((token or "").encode(), expected.encode())
+
+
+def token_error(expected, header="X-Admin-Token"):
+    """A 403 response unless the Flask request carries the expected token, else None"""
+    if not token_valid(request.headers.get(header, ""), expected):
+        return jsonify({"error": "Admin token required"}), 403
+    return None
@@ -0,0 +1,334 @@
+"""Admission control: per-user and global token buckets plus concurrency limits.
+
+Every route is mapped to an endpoint class (cheap lookup, DB write, CPU-heavy
+render, password hash). Each class has
+
+  * a global token bucket and a per-user token bucket; an empty bucket sheds
+    the request with 429 and a Retry-After telling the client when a token
+    will be available, and
+  * a concurrency limit with a queue deadline; a request that cannot start
+    before the deadline is shed with 503 instead of piling up behind the
+    others.
+
+Bucket levels and in-flight counts live in a small SQLite file, so the limits
+hold across all gunicorn workers on the host. Limits come from DEFAULT_CONFIG,
+overridden by the JSON file named in ADMISSION_CONFIG, which is re-read when it
+changes, so limits can be tuned on a running server. Admission control is off
+unless that file sets "enabled": true; a file that cannot be read or parsed is
+reported and ignored.
+
+Per-client buckets are keyed on the client address. Behind a load balancer
+set "proxy_hops" to the number of proxies that append to X-Forwarded-For
+(1 for a single load balancer); otherwise every client shares the proxy's
+address. The header is ignored when proxy_hops is 0, so clients cannot pick
+their own key.
+"""
+import os
+import json
+import math
+import time
+import sqlite3
+import tempfile
+import threading
+
+from flask import g, jsonify, request
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "proxy_hops": 0,
+    "store": os.path.join(tempfile.gettempdir(), "aqi-admission.db"),
+    # rate/user_rate are tokens per second, burst/user_burst the bucket sizes
+    "classes": {
+        "lookup": {"rate": 200, "burst": 400, "user_rate": 20, "user_burst": 40,
+                   "concurrency": 32, "queue_timeout": 0.25},
+        "db_write": {"rate": 50, "burst": 100, "user_rate": 5, "user_burst": 10,
+                     "concurrency": 8, "queue_timeout": 1.0},
+        "render": {"rate": 4, "burst": 8, "user_rate": 0.5, "user_burst": 10,
+                   "concurrency": 2, "queue_timeout": 5.0},
+        "predict": {"rate": 100, "burst": 200, "user_rate": 10, "user_burst": 20,
+                    "concurrency": 8, "queue_timeout": 0.5},
+        "password_hash": {"rate": 10, "burst": 20, "user_rate": 1, "user_burst": 5,
+                          "concurrency": 4, "queue_timeout": 2.0},
+    },
+    # Flask endpoint name -> class; endpoints not listed are not limited
+    "routes": {
+        "aqi": "lookup",
+        "check_user": "lookup",
+        "get_history": "lookup",
+        "get_series": "lookup",
+        "debug_dataset": "lookup",
+        "readings_stats": "lookup",
+        "model_status": "lookup",
+        "get_aqi": "db_write",
+        "add_readings": "db_write",
+        "get_aqi_graphs": "render",
+        "get_report": "render",
+        "forecast": "predict",
+        "login": "password_hash",
+        "signup": "password_hash",
+    },
+}
+CONFIG_CHECK_SECONDS = 5.0
+PRUNE_SECONDS = 60.0
+
+
+def load_config(path=None):
+    """DEFAULT_CONFIG with the JSON file at path merged over it, class by class"""
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if not path:
+        return config
+    with open(path) as f:
+        overrides = json.load(f)
+    if not isinstance(overrides, dict):
+        raise ValueError("admission config must be a JSON object")
+    for key, value in overrides.items():
+        if key == "classes":
+            for name, limits in value.items():
+                config["classes"].setdefault(name, {}).update(limits)
+        elif key == "routes":
+            config["routes"].update(value)
+        else:
+            config[key] = value
+    return config
+
+
+class AdmissionStore:
+    """Token buckets and in-flight counters shared by all workers via SQLite"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS inflight "
+                         "(class TEXT NOT NULL, pid INTEGER NOT NULL, count INTEGER NOT NULL, "
+                         "PRIMARY KEY (class, pid))")
+        self.reap_dead_workers()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def reap_dead_workers(self):
+        """Drop in-flight counts left behind by this pid's predecessor or dead workers"""
+        conn = self._connect()
+        pids = [row[0] for row in conn.execute("SELECT DISTINCT pid FROM inflight")]
+        for pid in pids:
+            if pid == os.getpid() or not _pid_alive(pid):
+                conn.execute("DELETE FROM inflight WHERE pid = ?", (pid,))
+
+    def take(self, buckets, now=None):
+        """Take one token from every (key, rate, burst) bucket, or from none.
+
+        Returns 0 on success, otherwise the seconds until all buckets would
+        have a token again.
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            wait = 0.0
+            for key, rate, burst in buckets:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                levels.append((key, tokens))
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate if rate > 0 else math.inf)
+            if wait == 0.0:
+                levels = [(key, tokens - 1) for key, tokens in levels]
+            conn.executemany("INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                             "updated = excluded.updated",
+                             [(key, tokens, now) for key, tokens in levels])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def prune(self, before):
+        """Forget buckets not touched since before; callers pass a time after
+        which any bucket has refilled, so this never changes a decision"""
+        self._connect().execute("DELETE FROM buckets WHERE updated < ?", (before,))
+
+    def try_enter(self, name, limit):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (running,) = conn.execute("SELECT COALESCE(SUM(count), 0) FROM inflight WHERE class = ?",
+                                      (name,)).fetchone()
+            admitted = running < limit
+            if admitted:
+                conn.execute("INSERT INTO inflight (class, pid, count) VALUES (?, ?, 1) "
+                             "ON CONFLICT(class, pid) DO UPDATE SET count = count + 1",
+                             (name, os.getpid()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return admitted
+
+    def enter(self, name, limit, timeout):
+        """Wait up to timeout seconds for a free slot; True if one was taken"""
+        deadline = time.monotonic() + timeout
+        delay = 0.002
+        while True:
+            if self.try_enter(name, limit):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+
+    def leave(self, name):
+        self._connect().execute("UPDATE inflight SET count = MAX(count - 1, 0) "
+                                "WHERE class = ? AND pid = ?", (name, os.getpid()))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists but belongs to someone else
+    return True
+
+
+def refill_seconds(config):
+    """Longest time any bucket in config takes to refill from empty"""
+    seconds = 0.0
+    for limits in config["classes"].values():
+        for rate, burst in ((limits["rate"], limits["burst"]),
+                            (limits["user_rate"], limits["user_burst"])):
+            seconds = max(seconds, burst / rate if rate > 0 else math.inf)
+    return seconds
+
+
+class AdmissionController:
+    def __init__(self, config_path=None):
+        self.config_path = config_path
+        self._config_mtime = None
+        self._next_check = 0.0
+        self._next_prune = 0.0
+        try:
+            self.config = load_config(config_path)
+            if config_path:
+                self._config_mtime = os.path.getmtime(config_path)
+        except Exception as e:
+            print(f"Error loading admission config {config_path}, admission control is off: {e}")
+            self.config = load_config()
+        self._store = None
+        self._store_lock = threading.Lock()
+
+    @property
+    def store(self):
+        """The shared SQLite store, opened on first use, so a disabled
+        controller never creates the file"""
+        path = self.config["store"]
+        if self._store is None or self._store.path != path:
+            with self._store_lock:
+                if self._store is None or self._store.path != path:
+                    self._store = AdmissionStore(path)
+        return self._store
+
+    def _maybe_reload(self):
+        if not self.config_path or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + CONFIG_CHECK_SECONDS
+        try:
+            mtime = os.path.getmtime(self.config_path)
+            if mtime != self._config_mtime:
+                self._config_mtime = mtime  # a broken file is reported once, not every check
+                self.config = load_config(self.config_path)
+                print(f"Reloaded admission config from {self.config_path}")
+        except Exception as e:
+            print(f"Error reloading admission config, keeping the previous one: {e}")
+
+    def _client_key(self, remote_addr, forwarded_for):
+        hops = self.config["proxy_hops"]
+        if hops:
+            forwarded = [a.strip() for a in (forwarded_for or "").split(",")]
+            if len(forwarded) >= hops and forwarded[-hops]:
+                # The address the outermost trusted proxy saw
+                return f"addr:{forwarded[-hops]}"
+        return f"addr:{remote_addr}"
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + PRUNE_SECONDS
+        horizon = refill_seconds(self.config)
+        if math.isfinite(horizon):
+            self.store.prune(now - horizon)
+
+    def admit(self, endpoint, remote_addr, forwarded_for=""):
+        """Admit a request to endpoint, blocking up to the class's queue timeout.
+
+        Returns (class name, None) when admitted, to be passed to release()
+        afterwards; (None, None) when the endpoint is not limited; otherwise
+        (None, (body, status, retry_after)) for the rejection. Used by both
+        the Flask hooks below and async_app.py.
+        """
+        self._maybe_reload()
+        config = self.config
+        if not config["enabled"] or endpoint is None:
+            return None, None
+        name = config["routes"].get(endpoint)
+        if name is None:
+            return None, None
+        limits = config["classes"][name]
+
+        self._maybe_prune()
+        wait = self.store.take([
+            (f"{name}:global", limits["rate"], limits["burst"]),
+            (f"{name}:{self._client_key(remote_addr, forwarded_for)}",
+             limits["user_rate"], limits["user_burst"]),
+        ])
+        if wait:
+            retry_after = max(1, math.ceil(wait)) if math.isfinite(wait) else 60
+            return None, ({"error": "Too many requests, please retry later"}, 429, retry_after)
+
+        if not self.store.enter(name, limits["concurrency"], limits["queue_timeout"]):
+            return None, ({"error": "Server busy, please retry later"}, 503,
+                          max(1, math.ceil(limits["queue_timeout"])))
+        return name, None
+
+    def release(self, name):
+        if name is not None:
+            self.store.leave(name)
+
+    def before_request(self):
+        name, rejection = self.admit(request.endpoint, request.remote_addr,
+                                     request.headers.get("X-Forwarded-For", ""))
+        if rejection:
+            body, status, retry_after = rejection
+            response = jsonify(body)
+            response.status_code = status
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+        if name is not None:
+            g._admission_class = name
+        return None
+
+    def teardown_request(self, exc):
+        self.release(g.pop("_admission_class", None))
+
+
+def init_app(app):
+    """Install admission control unless the config disables it"""
+    controller = AdmissionController(os.getenv("ADMISSION_CONFIG"))
+    app.before_request(controller.before_request)
+    app.teardown_request(controller.teardown_request)
+    app.extensions["admission"] = controller
+    return controller
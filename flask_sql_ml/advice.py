@@ -0,0 +1,51 @@
+"""Monthly AQI table and health advice shared by the sync and async apps"""
+
+# AQI Dataset (Mock Data)
+AQI_BY_MONTH = [338, 355, 300, 250, 240, 200, 210, 226, 200, 310, 320, 330]
+
+
+def solutions_for(aqi_value):
+    """Advice for each user category at the given AQI"""
+    if aqi_value <= 50:
+        solutions = {
+            "Lung Disease/Asthma": "Air quality is safe. No special precautions are needed.",
+            "Old Age": "Enjoy fresh air, but avoid dust exposure.",
+            "Normal People": "No restrictions. Enjoy outdoor activities."
+        }
+
+    elif aqi_value <= 100:
+        solutions = {
+            "Lung Disease/Asthma": "Air quality is acceptable but be cautious with prolonged outdoor activities.",
+            "Old Age": "Consider avoiding high-traffic areas.",
+            "Normal People": "Outdoor activities are fine, but stay aware of air changes."
+        }
+
+    elif aqi_value <= 150:
+        solutions = {
+            "Lung Disease/Asthma": "Limit outdoor activities. Always carry an inhaler if needed.",
+            "Old Age": "Reduce prolonged outdoor exposure.",
+            "Normal People": "Most people are fine, but sensitive individuals should be cautious."
+        }
+
+    elif aqi_value <= 200:
+        solutions = {
+            "Lung Disease/Asthma": "Wear an N95 mask outdoors. Use an air purifier indoors.",
+            "Old Age": "Stay indoors as much as possible and keep windows closed.",
+            "Normal People": "Reduce outdoor activities and avoid prolonged exposure."
+        }
+
+    elif aqi_value <= 300:
+        solutions = {
+            "Lung Disease/Asthma": "Avoid going outside. If necessary, wear a mask and take medication as prescribed.",
+            "Old Age": "Serious health risks. Stay inside with air purification if possible.",
+            "Normal People": "Avoid strenuous outdoor activities. Consider working indoors."
+        }
+
+    else:
+        solutions = {
+            "Lung Disease/Asthma": "Severe risk! Stay indoors with an air purifier. Seek medical attention if breathing issues arise.",
+            "Old Age": "Health emergency! Avoid going outside completely. Keep emergency contacts ready.",
+            "Normal People": "Everyone should remain indoors and reduce physical activity."
+        }
+
+    return solutions
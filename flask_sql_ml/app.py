@@ -4,40 +4,55 @@ from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_migrate import Migrate
-import nbformat
-from nbconvert.preprocessors import ExecutePreprocessor
-from nbconvert import HTMLExporter
-import tempfile
 import io
 import base64
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 import asyncio
 import sys
 
-if sys.platform.startswith('win'):
-    from asyncio import WindowsSelectorEventLoopPolicy
-    import asyncio
-    asyncio.set_event_loop_policy(WindowsSelectorEventLoopPolicy())
+if sys.platform == 'win32':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-import pickle
 import Updated_Visualization as vis
 import traceback
+from model_registry import ModelRegistry, DEFAULT_FEATURES
+from ensemble import Ensemble, MAX_BATCH
+import admin_auth
+from range_queries import RESOLUTIONS, downsample
+from partitioned_store import UnknownCity
+import instrumentation
+import profiling
+import admission
+import handlers
+from handlers import validate_json
+import fast_json
+import compression
+import reports
+from instrumentation import span
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(base_dir, "rf_model.pkl")
-# Load trained Random Forest model
-try:
-    with open(model_path, "rb") as f:
-        rf_model = pickle.load(f)
-    print("Random Forest model loaded successfully.")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    rf_model = None
-
-# Set the event loop policy at the very beginning of your application
-asyncio.set_event_loop_policy(WindowsSelectorEventLoopPolicy())
+# Trained Random Forest model, loaded on first use; new versions published to
+# the registry are validated in the background and swapped in without
+# restarting the worker
+model_registry = ModelRegistry(
+    registry_dir=os.getenv('MODEL_REGISTRY_DIR', os.path.join(base_dir, "model_registry")),
+    name="rf",
+    legacy_path=model_path,
+    poll_interval=float(os.getenv('MODEL_POLL_INTERVAL', '30')),
+)
+# XGBoost model from `train_model.py --xgboost`, scored next to the forest by /forecast
+xgb_registry = ModelRegistry(
+    registry_dir=os.getenv('MODEL_REGISTRY_DIR', os.path.join(base_dir, "model_registry")),
+    name="xgb",
+    legacy_path=os.path.join(base_dir, "xgb_model.pkl"),
+    poll_interval=float(os.getenv('MODEL_POLL_INTERVAL', '30')),
+)
+registries = {"rf": model_registry, "xgb": xgb_registry}
+ensemble = Ensemble(
+    {name: registries[name] for name in os.getenv('ENSEMBLE_MODELS', 'rf,xgb').split(',')
+     if name in registries},
+    budget_ms=float(os.getenv('ENSEMBLE_BUDGET_MS', '50')),
+)
 
 # Flask App Initialization
 app = Flask(__name__)
@@ -48,6 +63,15 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
 migrate = Migrate(app, db)
+instrumentation.init_app(app)
+profiling.init_app(app)
+admission.init_app(app)
+fast_json.init_app(app)
+compression.init_app(app)
+# Opt-in: kernels otherwise start on the first /report. Prestarting at import
+# would also start them in the gunicorn master under --preload.
+if os.getenv('REPORT_PRESTART', '0') == '1':
+    reports.service().prestart()
 
 # User Model
 class User(db.Model):
@@ -69,11 +93,6 @@ with app.app_context():
     db.create_all()
 
 # Helper functions
-def validate_json(payload, required_fields):
-    if not payload:
-        return False
-    return all(field in payload and payload[field] for field in required_fields)
-
 def fig_to_base64(fig):
     """Convert matplotlib figure to base64 encoded image"""
     img = io.BytesIO()
@@ -89,7 +108,8 @@ def check_user():
     if not validate_json(data, ['username']):
         return jsonify({'error': 'Username is required'}), 400
 
-    exists = User.query.filter_by(username=data['username']).first() is not None
+    with span("db_query"):
+        exists = User.query.filter_by(username=data['username']).first() is not None
     return jsonify({'exists': exists}), 200
 
 @app.route('/signup', methods=['POST'])
@@ -100,18 +120,22 @@ def signup():
     if not validate_json(data, ['username', 'password', 'category']):
         return jsonify({'error': 'All fields are required'}), 400
 
-    if User.query.filter_by(username=data['username']).first():
+    with span("db_query"):
+        existing = User.query.filter_by(username=data['username']).first()
+    if existing:
         return jsonify({'error': 'Username already exists'}), 400
 
     try:
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        with span("password_hash"):
+            hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
         new_user = User(
             username=data['username'],
             password=hashed_password,
             category=data['category']
         )
         db.session.add(new_user)
-        db.session.commit()
+        with span("db_commit"):
+            db.session.commit()
         return jsonify({'message': 'User created successfully'}), 201
     except Exception as e:
         db.session.rollback()
@@ -123,8 +147,13 @@ def login():
     if not validate_json(data, ['username', 'password']):
         return jsonify({'error': 'Username and password required'}), 400
 
-    user = User.query.filter_by(username=data['username']).first()
-    if not user or not bcrypt.check_password_hash(user.password, data['password']):
+    with span("db_query"):
+        user = User.query.filter_by(username=data['username']).first()
+    if not user:
+        return jsonify({'error': 'Invalid credentials'}), 401
+    with span("password_hash"):
+        valid = bcrypt.check_password_hash(user.password, data['password'])
+    if not valid:
         return jsonify({'error': 'Invalid credentials'}), 401
 
     return jsonify({
@@ -133,14 +162,15 @@ def login():
         'category': user.category
     }), 200
 
-# AQI Dataset (Mock Data)
-aqidata = [338, 355, 300, 250, 240, 200, 210, 226, 200, 310, 320, 330]
+@app.errorhandler(UnknownCity)
+def unknown_city(e):
+    body, status = handlers.unknown_city(e)
+    return jsonify(body), status
 
 @app.route('/aqi/<int:index>', methods=['GET'])
 def aqi(index):
-    if not 1 <= index <= len(aqidata):
-        return jsonify({'error': 'Invalid month index (1-12)'}), 400
-    return jsonify({'month_index': index, 'aqi_value': aqidata[index - 1]})
+    body, status = handlers.aqi_lookup(index, request.args.get('city'))
+    return jsonify(body), status
 
 @app.route('/predict/<int:index>', methods=['POST'])
 def get_aqi(index):
@@ -148,14 +178,19 @@ def get_aqi(index):
     if not validate_json(data, ['username']):
         return jsonify({'error': 'Username is required'}), 400
 
-    user = User.query.filter_by(username=data['username']).first()
+    with span("db_query"):
+        user = User.query.filter_by(username=data['username']).first()
     if not user:
         return jsonify({'error': 'User not found'}), 401
 
-    if not 1 <= index <= len(aqidata):
-        return jsonify({'error': 'Invalid month index (1-12)'}), 400
+    error = handlers.month_error(index)
+    if error:
+        return jsonify(error[0]), error[1]
 
-    aqi_value = aqidata[index - 1]
+    aqi_value = handlers.month_aqi(index, data.get('city'))
+    if aqi_value is None:
+        body, status = handlers.no_data(index)
+        return jsonify(body), status
     try:
         new_request = AQIRequest(
             user_id=user.id,
@@ -163,58 +198,13 @@ def get_aqi(index):
             aqi_value=aqi_value
         )
         db.session.add(new_request)
-        db.session.commit()
+        with span("db_commit"):
+            db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-    if aqi_value <= 50:
-        solutions = {
-            "Lung Disease/Asthma": "Air quality is safe. No special precautions are needed.",
-            "Old Age": "Enjoy fresh air, but avoid dust exposure.",
-            "Normal People": "No restrictions. Enjoy outdoor activities."
-        }
-
-    elif aqi_value <= 100:
-        solutions = {
-            "Lung Disease/Asthma": "Air quality is acceptable but be cautious with prolonged outdoor activities.",
-            "Old Age": "Consider avoiding high-traffic areas.",
-            "Normal People": "Outdoor activities are fine, but stay aware of air changes."
-        }
-
-    elif aqi_value <= 150:
-        solutions = {
-            "Lung Disease/Asthma": "Limit outdoor activities. Always carry an inhaler if needed.",
-            "Old Age": "Reduce prolonged outdoor exposure.",
-            "Normal People": "Most people are fine, but sensitive individuals should be cautious."
-        }
-
-    elif aqi_value <= 200:
-        solutions = {
-            "Lung Disease/Asthma": "Wear an N95 mask outdoors. Use an air purifier indoors.",
-            "Old Age": "Stay indoors as much as possible and keep windows closed.",
-            "Normal People": "Reduce outdoor activities and avoid prolonged exposure."
-        }
-
-    elif aqi_value <= 300:
-        solutions = {
-            "Lung Disease/Asthma": "Avoid going outside. If necessary, wear a mask and take medication as prescribed.",
-            "Old Age": "Serious health risks. Stay inside with air purification if possible.",
-            "Normal People": "Avoid strenuous outdoor activities. Consider working indoors."
-        }
-
-    else:
-        solutions = {
-            "Lung Disease/Asthma": "Severe risk! Stay indoors with an air purifier. Seek medical attention if breathing issues arise.",
-            "Old Age": "Health emergency! Avoid going outside completely. Keep emergency contacts ready.",
-            "Normal People": "Everyone should remain indoors and reduce physical activity."
-        }
-
-    return jsonify({
-        'month_index': index,
-        'aqi_value': aqi_value,
-        'solution': solutions.get(user.category, 'No specific solution available.')
-    })
+    return jsonify(handlers.prediction(index, aqi_value, user.category))
 
 
 @app.route('/history', methods=['POST'])
@@ -223,77 +213,160 @@ def get_history():
     if not validate_json(data, ['username']):
         return jsonify({'error': 'Username is required'}), 400
 
-    user = User.query.filter_by(username=data['username']).first()
-    if not user:
-        return jsonify({'error': 'User not found'}), 401
+    with span("db_query"):
+        user = User.query.filter_by(username=data['username']).first()
+        if not user:
+            return jsonify({'error': 'User not found'}), 401
 
-    history = AQIRequest.query.filter_by(user_id=user.id)\
-                 .order_by(AQIRequest.timestamp.desc())\
-                 .limit(10).all()
-    
-    history_data = [{
-        'month_index': record.month_index,
-        'aqi_value': record.aqi_value,
-        'timestamp': record.timestamp.isoformat()
-    } for record in history]
+        history = AQIRequest.query.filter_by(user_id=user.id)\
+                     .order_by(AQIRequest.timestamp.desc())\
+                     .limit(10).all()
 
-    return jsonify({'history': history_data})
+    return jsonify(handlers.history(
+        (record.month_index, record.aqi_value, record.timestamp) for record in history))
 
-# Load AQI dataset
-try:
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    dataset_path = os.path.join(base_dir, 'Final_Dataset.csv')
-    df = pd.read_csv(dataset_path)
-    print(f"Successfully loaded AQI dataset from {dataset_path}")
-except Exception as e:
-    print(f"Error loading AQI dataset: {e}")
-    df = pd.DataFrame()  # Empty dataframe as fallback
+# AQI dataset, shared with the visualizations and kept current by /readings
+dataset = vis.store
 
 @app.route('/debug-dataset', methods=['GET'])
 def debug_dataset():
-    if df.empty:
+    city = request.args.get('city')
+    with span("dataset_slice"):
+        info = vis.dataset_for(city).describe()
+    if not info["rows"]:
         return jsonify({"error": "Dataset not loaded or empty"})
-    return jsonify({"columns": df.columns.tolist(), "rows": len(df)})
+    if city is None:
+        return jsonify(info)
+    return jsonify(dict(info, city=city, cities=vis.cities.cities(), store=vis.cities.status()))
+
+@app.route('/readings', methods=['POST'])
+def add_readings():
+    """Append one reading or a batch of readings to the dataset (admin token required)"""
+    denied = admin_auth.token_error(admin_auth.READINGS_ADMIN_TOKEN)
+    if denied:
+        return denied
+    body, status = handlers.add_readings(request.get_json(silent=True))
+    return jsonify(body), status
+
+@app.route('/series', methods=['GET'])
+def get_series():
+    """Mean/min/max AQI and pollutant means per day, week or month in a date range.
+
+    Query parameters: start, end (YYYY-MM-DD, default: whole dataset),
+    resolution (daily|weekly|monthly) and points (optional point budget).
+    """
+    if dataset.empty:
+        return jsonify({'error': 'Dataset not loaded or empty'}), 503
+    with span("dataset_slice"):
+        index = dataset.range_aggregates()
+
+    resolution = request.args.get('resolution', 'daily')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    try:
+        start = datetime.date.fromisoformat(request.args.get('start', str(index.dates[0])))
+        end = datetime.date.fromisoformat(request.args.get('end', str(index.dates[-1])))
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+    points = request.args.get('points')
+    if points is not None:
+        try:
+            points = int(points)
+        except ValueError:
+            return jsonify({'error': 'points must be an integer'}), 400
+        if points < 3:
+            return jsonify({'error': 'points must be at least 3'}), 400
+
+    with span("aggregate"):
+        series = downsample(index.series(start, end, resolution), points)
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'resolution': resolution,
+        'series': series
+    })
+
+@app.route('/readings/stats', methods=['GET'])
+def readings_stats():
+    """Rolling AQI means, per-month yearly means and pollutant shares"""
+    return jsonify(dataset.summary())
+
+@app.route('/model-status', methods=['GET'])
+def model_status():
+    """Active model version, load timings and registry state for this worker"""
+    status = model_registry.status()
+    status['xgb'] = xgb_registry.status()
+    status['ensemble'] = ensemble.status()
+    return jsonify(status)
+
+@app.route('/forecast', methods=['POST'])
+def forecast():
+    """Ensemble AQI estimate with an uncertainty band for a batch of readings"""
+    data = request.get_json(silent=True)
+    readings = data.get('readings') if isinstance(data, dict) else None
+    if not isinstance(readings, list) or not readings:
+        return jsonify({'error': 'readings must be a non-empty list'}), 400
+    if len(readings) > MAX_BATCH:
+        return jsonify({'error': f'At most {MAX_BATCH} readings per request'}), 400
+    for i, reading in enumerate(readings):
+        if not isinstance(reading, dict) or not all(
+                isinstance(reading.get(f), (int, float)) and not isinstance(reading.get(f), bool)
+                for f in DEFAULT_FEATURES):
+            return jsonify({'error': f"readings[{i}] needs numeric {', '.join(DEFAULT_FEATURES)}"}), 400
+    budget_ms = data.get('budget_ms')
+    if budget_ms is not None and (not isinstance(budget_ms, (int, float)) or budget_ms <= 0):
+        return jsonify({'error': 'budget_ms must be a positive number'}), 400
+
+    try:
+        with span("ensemble"):
+            result = ensemble.predict(readings, budget_ms)
+    except RuntimeError as e:  # no member loaded, or every member failed
+        return jsonify({'error': str(e)}), 503
+    return jsonify(result)
 
 
 
 @app.route('/run-notebook', methods=['POST'])
 def get_aqi_graphs():
     try:
-        data = request.get_json()
-        if not data or 'month' not in data:
-            return jsonify({"error": "Month parameter is required"}), 400
-
-        month = int(data.get("month"))
+        try:
+            month, city = handlers.visualization_request(request.get_json())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         print(f"Received month for visualization: {month}")
 
-        # Generate base64 images directly (they're already base64!)
-        histogram_img = vis.plot_aqi_histogram(month)
-        trend_img = vis.plot_aqi_trend(month)
-        heatmap_img = vis.plot_aqi_heatmap(month)
-        pollutants_img = vis.plot_pollutant_contribution(month)
-
-        # Only include non-None images (pie chart can return None)
-        visualizations = {}
-        if histogram_img:
-            visualizations["histogram"] = histogram_img
-        if trend_img:
-            visualizations["trend"] = trend_img
-        if heatmap_img:
-            visualizations["heatmap"] = heatmap_img
-        if pollutants_img:
-            visualizations["pollutants"] = pollutants_img
+        visualizations = vis.create_visualizations(month, city)
 
         return jsonify({
             "message": "Visualizations generated successfully",
             "visualizations": visualizations
         })
 
+    except UnknownCity:
+        raise
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"Failed to generate visualizations: {str(e)}"}), 500
 
 
+@app.route('/report/<int:month>', methods=['GET'])
+def get_report(month):
+    """Full HTML analysis report for a month, from the report cache when possible"""
+    if not 1 <= month <= 12:
+        return jsonify({'error': 'Month must be 1-12'}), 400
+    try:
+        report = reports.get_report(month)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
+    response = app.response_class(report.html, mimetype='text/html')
+    response.headers['X-Report-Status'] = report.status
+    response.headers['X-Report-Key'] = report.key
+    return response
+
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,353 @@
+"""Asyncio serving mode for the I/O-bound endpoints.
+
+    uvicorn async_app:app --workers 2 --port 8000
+
+Serves /aqi, /check-user, /predict and /history (plus /signup, /login and
+/run-notebook so the mobile client works against it unchanged, and the
+admin-only /readings) as async Quart views on the same database as app.py.
+One process keeps many mobile connections open while they wait on the network
+or on SQLite (benchmarks/bench_async.py measures 128 concurrent clients),
+instead of one request per gunicorn worker.
+
+Request parsing and response bodies come from handlers.py, shared with
+app.py. Database access goes through aiosqlite connections from a small pool;
+only sqlite DATABASE_URLs are supported. bcrypt and admission checks each have
+their own thread pool, dataset appends use the default one and chart rendering
+a process pool, so none of them blocks the event loop. Request latencies are recorded and served on
+/metrics as in app.py, and the same ADMISSION_CONFIG applies; on-demand
+profiling is Flask-only.
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import datetime
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import aiosqlite
+from flask_bcrypt import Bcrypt
+from quart import Quart, g, request, jsonify
+
+import admin_auth
+import admission
+import handlers
+import instrumentation
+import Updated_Visualization as vis
+from handlers import validate_json
+from partitioned_store import UnknownCity
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///users.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+HASH_THREADS = int(os.getenv('HASH_THREADS', '4'))
+ADMISSION_THREADS = int(os.getenv('ADMISSION_THREADS', '16'))
+RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', '2'))
+
+app = Quart(__name__)
+bcrypt = Bcrypt()
+admission_controller = admission.AdmissionController(os.getenv("ADMISSION_CONFIG"))
+
+
+def sqlite_path(url):
+    """File behind a sqlite:/// URL, resolved like Flask-SQLAlchemy does"""
+    if not url.startswith('sqlite:///'):
+        raise RuntimeError(f"async_app only supports sqlite DATABASE_URLs, got {url!r}")
+    path = url[len('sqlite:///'):]
+    if path != ':memory:' and not os.path.isabs(path):
+        # Flask-SQLAlchemy puts relative sqlite paths in the instance folder
+        path = os.path.join(base_dir, 'instance', path)
+    return path
+
+
+class ConnectionPool:
+    """A fixed set of aiosqlite connections handed out one request at a time"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = asyncio.Queue()
+
+    async def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        with conn:
+            # WAL lets readers in other workers carry on during a write; the
+            # schema matches the models in app.py, for a fresh database
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS user (id INTEGER NOT NULL, "
+                         "username VARCHAR(80) NOT NULL, password VARCHAR(120) NOT NULL, "
+                         "category VARCHAR(50) NOT NULL, PRIMARY KEY (id), UNIQUE (username))")
+            conn.execute("CREATE TABLE IF NOT EXISTS aqi_request (id INTEGER NOT NULL, "
+                         "user_id INTEGER NOT NULL, month_index INTEGER NOT NULL, "
+                         "aqi_value INTEGER NOT NULL, timestamp DATETIME, PRIMARY KEY (id), "
+                         "FOREIGN KEY(user_id) REFERENCES user (id))")
+        conn.close()
+        for _ in range(self.size):
+            self._idle.put_nowait(await aiosqlite.connect(self.path, timeout=30))
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._idle.get_nowait().close()
+
+    def connection(self):
+        return _PooledConnection(self._idle)
+
+
+class _PooledConnection:
+    def __init__(self, idle):
+        self._idle = idle
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._idle.get()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._conn.in_transaction:
+            await self._conn.rollback()
+        self._idle.put_nowait(self._conn)
+
+
+pool = ConnectionPool(sqlite_path(DATABASE_URL), DB_POOL_SIZE)
+hash_executor = None
+admission_executor = None
+render_executor = None
+
+
+@app.before_serving
+async def startup():
+    global hash_executor, admission_executor, render_executor
+    await pool.open()
+    hash_executor = ThreadPoolExecutor(HASH_THREADS, thread_name_prefix="bcrypt")
+    # admit() can block for a class's whole queue timeout; on its own threads
+    # a queue of renders never holds up the default executor's dataset work
+    admission_executor = ThreadPoolExecutor(ADMISSION_THREADS, thread_name_prefix="admission")
+    # Spawn, not fork: aiosqlite's connection threads already exist here
+    render_executor = ProcessPoolExecutor(RENDER_PROCESSES,
+                                          mp_context=multiprocessing.get_context("spawn"))
+
+
+@app.after_serving
+async def shutdown():
+    await pool.close()
+    hash_executor.shutdown(wait=False)
+    admission_executor.shutdown(wait=False)
+    render_executor.shutdown(wait=False)
+
+
+@app.before_request
+async def before_request():
+    g.metrics_start = time.perf_counter()
+    name, rejection = await run_in(admission_executor, admission_controller.admit,
+                                   request.endpoint, request.remote_addr,
+                                   request.headers.get("X-Forwarded-For", ""))
+    if rejection:
+        body, status, retry_after = rejection
+        return jsonify(body), status, {"Retry-After": str(retry_after)}
+    g.admission_class = name
+
+
+@app.after_request
+async def after_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        instrumentation.observe_request(request.url_rule, request.method,
+                                        response.status_code, start)
+    return response
+
+
+@app.teardown_request
+async def teardown_request(exc):
+    name = g.pop("admission_class", None)
+    if name is not None:
+        await run_in(admission_executor, admission_controller.release, name)
+
+
+# Helper functions
+def utc_timestamp():
+    # The text format SQLAlchemy uses for DateTime columns on sqlite
+    return datetime.datetime.utcnow().isoformat(sep=' ', timespec='microseconds')
+
+
+async def find_user(conn, username):
+    async with conn.execute("SELECT id, username, password, category FROM user WHERE username = ?",
+                            (username,)) as cursor:
+        return await cursor.fetchone()
+
+
+async def run_in(executor, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def month_aqi(index, city):
+    """handlers.month_aqi off the loop; it may load the dataset or read partitions"""
+    return await run_in(None, handlers.month_aqi, index, city)
+
+
+@app.errorhandler(UnknownCity)
+async def unknown_city(e):
+    body, status = handlers.unknown_city(e)
+    return jsonify(body), status
+
+
+# Routes
+@app.route('/check-user', methods=['POST'])
+async def check_user():
+    """Check if a username exists in the database"""
+    data = await request.get_json(silent=True)
+    if not validate_json(data, ['username']):
+        return jsonify({'error': 'Username is required'}), 400
+
+    async with pool.connection() as conn:
+        exists = await find_user(conn, data['username']) is not None
+    return jsonify({'exists': exists}), 200
+
+
+@app.route('/signup', methods=['POST'])
+async def signup():
+    data = await request.get_json(silent=True)
+    if not validate_json(data, ['username', 'password', 'category']):
+        return jsonify({'error': 'All fields are required'}), 400
+
+    async with pool.connection() as conn:
+        if await find_user(conn, data['username']) is not None:
+            return jsonify({'error': 'Username already exists'}), 400
+    # Hash without holding a connection; bcrypt takes a few hundred ms
+    hashed_password = (await run_in(hash_executor, bcrypt.generate_password_hash,
+                                    data['password'])).decode('utf-8')
+    try:
+        async with pool.connection() as conn:
+            await conn.execute("INSERT INTO user (username, password, category) VALUES (?, ?, ?)",
+                               (data['username'], hashed_password, data['category']))
+            await conn.commit()
+    except aiosqlite.IntegrityError:
+        return jsonify({'error': 'Username already exists'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'message': 'User created successfully'}), 201
+
+
+@app.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json(silent=True)
+    if not validate_json(data, ['username', 'password']):
+        return jsonify({'error': 'Username and password required'}), 400
+
+    async with pool.connection() as conn:
+        user = await find_user(conn, data['username'])
+    if not user:
+        return jsonify({'error': 'Invalid credentials'}), 401
+    if not await run_in(hash_executor, bcrypt.check_password_hash, user[2], data['password']):
+        return jsonify({'error': 'Invalid credentials'}), 401
+
+    return jsonify({
+        'status': 'success',
+        'username': user[1],
+        'category': user[3]
+    }), 200
+
+
+@app.route('/aqi/<int:index>', methods=['GET'])
+async def aqi(index):
+    error = handlers.month_error(index)
+    if error:
+        return jsonify(error[0]), error[1]
+    aqi_value = await month_aqi(index, request.args.get('city'))
+    if aqi_value is None:
+        body, status = handlers.no_data(index)
+        return jsonify(body), status
+    return jsonify({'month_index': index, 'aqi_value': aqi_value})
+
+
+@app.route('/predict/<int:index>', methods=['POST'])
+async def get_aqi(index):
+    data = await request.get_json(silent=True)
+    if not validate_json(data, ['username']):
+        return jsonify({'error': 'Username is required'}), 400
+
+    async with pool.connection() as conn:
+        user = await find_user(conn, data['username'])
+        if not user:
+            return jsonify({'error': 'User not found'}), 401
+
+        error = handlers.month_error(index)
+        if error:
+            return jsonify(error[0]), error[1]
+
+        aqi_value = await month_aqi(index, data.get('city'))
+        if aqi_value is None:
+            body, status = handlers.no_data(index)
+            return jsonify(body), status
+        try:
+            await conn.execute("INSERT INTO aqi_request (user_id, month_index, aqi_value, timestamp) "
+                               "VALUES (?, ?, ?, ?)", (user[0], index, aqi_value, utc_timestamp()))
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            return jsonify({'error': str(e)}), 500
+
+    return jsonify(handlers.prediction(index, aqi_value, user[3]))
+
+
+@app.route('/history', methods=['POST'])
+async def get_history():
+    data = await request.get_json(silent=True)
+    if not validate_json(data, ['username']):
+        return jsonify({'error': 'Username is required'}), 400
+
+    async with pool.connection() as conn:
+        user = await find_user(conn, data['username'])
+        if not user:
+            return jsonify({'error': 'User not found'}), 401
+        async with conn.execute("SELECT month_index, aqi_value, timestamp FROM aqi_request "
+                                "WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10",
+                                (user[0],)) as cursor:
+            history = await cursor.fetchall()
+
+    return jsonify(handlers.history(history))
+
+
+@app.route('/readings', methods=['POST'])
+async def add_readings():
+    """Append live sensor readings; admin-only, like app.py's /readings"""
+    if not admin_auth.token_valid(request.headers.get("X-Admin-Token", ""),
+                                  admin_auth.READINGS_ADMIN_TOKEN):
+        return jsonify({"error": "Admin token required"}), 403
+    data = await request.get_json(silent=True)
+    body, status = await run_in(None, handlers.add_readings, data)
+    return jsonify(body), status
+
+
+@app.route('/run-notebook', methods=['POST'])
+async def get_aqi_graphs():
+    try:
+        try:
+            month, city = handlers.visualization_request(await request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if city is not None:
+            vis.dataset_for(city)  # an unknown city is a 404 before a render process is used
+        # The dataset is loaded in each render process on first use
+        visualizations = await run_in(render_executor, vis.create_visualizations, month, city)
+
+        return jsonify({
+            "message": "Visualizations generated successfully",
+            "visualizations": visualizations
+        })
+
+    except UnknownCity:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to generate visualizations: {str(e)}"}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    return instrumentation.render_metrics(), 200, {"Content-Type": instrumentation.CONTENT_TYPE}
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
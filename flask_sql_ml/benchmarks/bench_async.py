@@ -0,0 +1,92 @@
+"""Sync gunicorn workers against the asyncio serving mode on the I/O-bound endpoints.
+
+    python benchmarks/bench_async.py [--concurrency 256] [--duration 20] [--output async.json]
+
+Starts app.py under gunicorn (sync workers) and async_app.py under uvicorn
+with the same number of worker processes, each against its own throwaway
+SQLite database, and replays the /aqi, /check-user, /predict and /history
+part of the client traffic at high concurrency with loadtest.py's clients.
+Both servers get loadtest.server_env's environment: their own database,
+model registry and readings log.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import loadtest  # noqa: E402
+
+IO_MIX = {"aqi": 1, "check-user": 1, "predict": 3, "history": 1}
+SERVERS = {
+    "sync": "gunicorn",
+    "async": f"{sys.executable} -m uvicorn async_app:app --host 127.0.0.1 --port {{port}} "
+             f"--log-level warning --backlog 4096",
+}
+
+
+def bench_server(label, args):
+    workdir = tempfile.TemporaryDirectory(prefix=f"aqi-bench-{label}-")
+    env = loadtest.server_env(workdir.name)
+    port = loadtest.free_port()
+    url = f"http://127.0.0.1:{port}"
+    extra_args = ["--workers", str(args.workers)] if label == "async" else []
+    process = loadtest.start_server(SERVERS[label], args.workers, port, env, extra_args)
+    try:
+        loadtest.wait_until_ready(url, process)
+        usernames = loadtest.seed_users(url, args.users, prefix=f"bench_{label}_")
+        print(f"{label}: {args.concurrency} clients against {url} for {args.duration}s")
+        report, elapsed = loadtest.run_load(url, usernames, IO_MIX, args.concurrency,
+                                            args.duration, 0, args.seed, args.timeout)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        workdir.cleanup()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2, help="worker processes per server")
+    parser.add_argument("--concurrency", type=int, default=256, help="client connections")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write both reports here as JSON")
+    args = parser.parse_args(argv)
+
+    reports = {label: bench_server(label, args) for label in SERVERS}
+
+    print(f"{'server':7} {'endpoint':12} {'reqs':>7} {'err':>5} {'rps':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    for label, report in reports.items():
+        for endpoint, r in report.items():
+            print(f"{label:7} {endpoint:12} {r['requests']:7d} {r['errors']:5d} "
+                  f"{r['throughput_rps']:8.1f} {fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "config": {"workers": args.workers, "concurrency": args.concurrency,
+                           "duration": args.duration, "users": args.users,
+                           "mix": IO_MIX, "seed": args.seed},
+                "host": {"python": platform.python_version(), "platform": platform.platform(),
+                         "cpu_count": os.cpu_count()},
+                "servers": reports,
+            }, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
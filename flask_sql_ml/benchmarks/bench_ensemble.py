@@ -0,0 +1,112 @@
+"""Forest alone, ensemble members one after another, and the parallel ensemble.
+
+    python benchmarks/bench_ensemble.py [--rounds 50] [--batches 1,32,256]
+
+rf:         the forest's own predict, what /predict-style scoring costs
+sequential: every member scored in turn on the request thread
+parallel:   ensemble.Ensemble.predict with members always on their own threads
+ensemble:   ensemble.Ensemble.predict as served, inline below inline_ms
+budget:     the threaded ensemble with half the slowest member's time as
+            budget, which then answers without it
+
+Threads only pay off with more than one core and batches large enough that a
+member takes longer than the hand-off; the parallel/sequential ratio shows
+where that is on a given host.
+
+Models are quick in-process fits on train_model.py's dataset (the forest with the
+tuned train_model.py parameters, XGBoost with XGB_PARAMS), wrapped in stub
+registries; the model registry on disk is not touched. Needs xgboost.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sklearn.ensemble import RandomForestRegressor  # noqa: E402
+from xgboost import XGBRegressor  # noqa: E402
+
+import ensemble  # noqa: E402
+from model_registry import LoadedModel, DEFAULT_FEATURES  # noqa: E402
+from train_model import XGB_PARAMS, DEFAULT_DATASET, load_dataset  # noqa: E402
+
+
+class StubRegistry:
+    def __init__(self, loaded):
+        self.loaded = loaded
+
+    def current(self):
+        return self.loaded
+
+
+def fit_members():
+    features, target = load_dataset(DEFAULT_DATASET)
+    X = features[DEFAULT_FEATURES].to_numpy(dtype=float)
+    y = target.to_numpy(dtype=float)
+    rf = RandomForestRegressor(n_estimators=50, max_depth=10, min_samples_split=5,
+                               random_state=42, n_jobs=1).fit(X, y)
+    xgb = XGBRegressor(random_state=42, n_jobs=1, **XGB_PARAMS).fit(X, y)
+    members = {}
+    for name, model in (("rf", rf), ("xgb", xgb)):
+        members[name] = StubRegistry(LoadedModel("bench", model, DEFAULT_FEATURES,
+                                                 {"metrics": {"mse": 1.0}}, {}, None))
+    return members, features[DEFAULT_FEATURES].to_dict("records")
+
+
+def timed(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--batches", default="1,32,256")
+    args = parser.parse_args(argv)
+
+    members, readings = fit_members()
+    rf = members["rf"].current()
+    parallel = ensemble.Ensemble(members, budget_ms=None, inline_ms=0)
+    served = ensemble.Ensemble(members, budget_ms=None)
+    sequential = ensemble.Ensemble(members, budget_ms=None)
+
+    print(f"{'batch':>6} {'mode':12} {'median ms':>10} {'p95 ms':>10}  members")
+    for batch in [int(b) for b in args.batches.split(",")]:
+        rows = readings[:batch]
+        X = [[row[f] for f in DEFAULT_FEATURES] for row in rows]
+        modes = {
+            "rf": lambda: rf.model.predict(X),
+            "sequential": lambda: [sequential._score(name, registry.current(), rows)
+                                   for name, registry in members.items()],
+            "parallel": lambda: parallel.predict(rows),
+            "ensemble": lambda: served.predict(rows),
+        }
+        parallel.predict(rows)  # warm the threads
+        served.predict(rows)  # and record member latencies
+        for mode, fn in modes.items():
+            timings = sorted(timed(fn, args.rounds))
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{batch:6d} {mode:12} {statistics.median(timings) * 1e3:10.2f} "
+                  f"{p95 * 1e3:10.2f}")
+
+        # Half the slowest member's average time: the ensemble answers without it
+        slowest = max(parallel.status()["members"].items(), key=lambda item: item[1]["avg_ms"])
+        budget_ms = slowest[1]["avg_ms"] * 0.5
+        results = [parallel.predict(rows, budget_ms=budget_ms) for _ in range(args.rounds)]
+        timings = sorted(r["total_ms"] for r in results)
+        answered = [name for name, entry in results[-1]["members"].items() if entry["status"] == "ok"]
+        skipped = sum(r["members"][slowest[0]]["status"] == "skipped" for r in results)
+        print(f"{batch:6d} {'budget':12} {statistics.median(timings):10.2f} "
+              f"{timings[min(len(timings) - 1, int(len(timings) * 0.95))]:10.2f}  "
+              f"{','.join(answered)} ({slowest[0]} skipped {skipped}/{len(results)}, "
+              f"budget {budget_ms:.2f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
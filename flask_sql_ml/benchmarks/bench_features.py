@@ -0,0 +1,97 @@
+"""Compare features.py with the notebook feature builders on the real dataset.
+
+    python benchmarks/bench_features.py [--repeat 20]
+
+Reports best-of-N wall time and peak traced allocation for:
+  * the XGBoost notebook's 6 x 7 shift() lag columns vs lag_matrix/lag_frame
+  * the CNN-LSTM notebook's create_sequences loop vs sliding_windows
+  * the CNN-LSTM notebook's np.roll window update vs OnlineWindow.append
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import features  # noqa: E402
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(base_dir, "Updated_Dataset_with_AQI (1).csv")
+LAG_WINDOW = 7
+WINDOW_SIZE = 24
+
+
+def notebook_lags(frame):
+    frame = frame.copy()
+    for col in features.POLLUTANTS:
+        for lag in range(1, LAG_WINDOW + 1):
+            frame[f'{col}_lag{lag}'] = frame[col].shift(lag)
+    return frame
+
+
+def notebook_create_sequences(features_arr, target, window_size=WINDOW_SIZE):
+    X, y = [], []
+    for i in range(len(features_arr) - window_size):
+        X.append(features_arr[i:i + window_size, :])
+        y.append(target[i + window_size])
+    return np.array(X), np.array(y)
+
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default=DATASET)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    raw = pd.read_csv(args.dataset, index_col=0)
+    frame = raw[features.POLLUTANTS].apply(pd.to_numeric, errors='coerce')
+    buffer = features.to_buffer(frame)
+    target = raw['AQI'].to_numpy(dtype=np.float32)
+    scaled = np.nan_to_num(buffer)
+    online = features.OnlineWindow.from_buffer(scaled, WINDOW_SIZE)
+    reading = scaled[-1]
+    latest = [scaled[-WINDOW_SIZE:]]
+
+    def notebook_roll():
+        latest[0] = np.roll(latest[0], -1, axis=0)
+        latest[0][-1] = reading
+        return latest[0]
+
+    cases = [
+        ("lags: notebook shift()", lambda: notebook_lags(frame)),
+        ("lags: lag_matrix (view)", lambda: features.lag_matrix(buffer, LAG_WINDOW)),
+        ("lags: lag_frame (dense)", lambda: features.lag_frame(buffer, LAG_WINDOW, index=frame.index)),
+        ("windows: create_sequences", lambda: notebook_create_sequences(scaled, target)),
+        ("windows: sliding_windows", lambda: features.sliding_windows(scaled, target, WINDOW_SIZE)),
+        ("online: notebook np.roll", notebook_roll),
+        ("online: OnlineWindow.append", lambda: (online.append(reading), online.window())),
+    ]
+
+    print(f"{len(raw)} rows, {len(features.POLLUTANTS)} features, best of {args.repeat}")
+    print(f"{'case':32} {'time (ms)':>12} {'peak alloc (KiB)':>18}")
+    for name, fn in cases:
+        seconds, peak = measure(fn, args.repeat)
+        print(f"{name:32} {seconds * 1000:12.3f} {peak / 1024:18.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Per-span and per-request cost of instrumentation.py.
+
+    python benchmarks/bench_instrumentation.py [--iterations 200000]
+
+The span numbers subtract an empty loop, so they are the overhead a
+`with span(...)` block adds around real work.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Flask  # noqa: E402
+
+import instrumentation  # noqa: E402
+from instrumentation import span, observe, PHASE_METRIC  # noqa: E402
+
+
+def per_call(fn, iterations):
+    start = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - start) / iterations
+
+
+def empty_loop(n):
+    for _ in range(n):
+        pass
+
+
+def span_loop(n):
+    for _ in range(n):
+        with span("bench"):
+            pass
+
+
+def observe_loop(n):
+    labels = (("phase", "bench"),)
+    for _ in range(n):
+        observe(PHASE_METRIC, labels, 0.001)
+
+
+def request_overhead(iterations):
+    """Test-client round trip with and without the request hooks"""
+    results = {}
+    for instrumented in (False, True):
+        app = Flask(f"bench_{instrumented}")
+        app.add_url_rule("/ping", "ping", lambda: "ok")
+        if instrumented:
+            instrumentation.init_app(app)
+        client = app.test_client()
+        client.get("/ping")
+        start = time.perf_counter()
+        for _ in range(iterations):
+            client.get("/ping")
+        results[instrumented] = (time.perf_counter() - start) / iterations
+    return results[True] - results[False], results[False]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    baseline = min(per_call(empty_loop, args.iterations) for _ in range(3))
+    span_cost = min(per_call(span_loop, args.iterations) for _ in range(3)) - baseline
+    observe_cost = min(per_call(observe_loop, args.iterations) for _ in range(3)) - baseline
+    hook_cost, bare_request = request_overhead(args.requests)
+
+    print(f"span() enter+exit       {span_cost * 1e6:8.3f} us")
+    print(f"observe()               {observe_cost * 1e6:8.3f} us")
+    print(f"request hooks           {hook_cost * 1e6:8.3f} us "
+          f"(bare test-client request {bare_request * 1e6:.1f} us)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Cold report generation against pooled kernels and cache hits.
+
+    python benchmarks/bench_reports.py [--rounds 5] [--month 1]
+
+cold:   what the old /run-notebook did, a fresh kernel per report
+        (nbconvert's ExecutePreprocessor) plus HTML export
+pooled: reports.ReportService.render on an already started, reused kernel
+hit:    reports.ReportService.get_report served from the disk cache
+
+The report cache lives in a temporary directory, never REPORT_CACHE_DIR.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nbformat  # noqa: E402
+from nbconvert import HTMLExporter  # noqa: E402
+from nbconvert.preprocessors import ExecutePreprocessor  # noqa: E402
+
+import reports  # noqa: E402
+
+
+def timed(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def cold_report(month):
+    nb = reports.parameterise(nbformat.read(reports.NOTEBOOK_PATH, as_version=4), month)
+    ExecutePreprocessor(timeout=600, kernel_name=reports.KERNEL_NAME, allow_errors=True).preprocess(
+        nb, resources={"metadata": {"path": os.path.dirname(reports.NOTEBOOK_PATH)}})
+    return HTMLExporter().from_notebook_node(nb)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--month", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    cache_dir = tempfile.mkdtemp(prefix="aqi-bench-reports-")
+    service = reports.ReportService(cache_dir=cache_dir, pool_size=1)
+    try:
+        service.pool.prestart()
+        service.render(args.month)  # warm the kernel's imports
+        results = {
+            "cold": timed(lambda: cold_report(args.month), args.rounds),
+            "pooled": timed(lambda: service.render(args.month), args.rounds),
+        }
+        service.get_report(args.month)
+        results["hit"] = timed(lambda: service.get_report(args.month), args.rounds * 20)
+    finally:
+        service.pool.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"{'mode':8} {'rounds':>7} {'min ms':>10} {'median ms':>10} {'max ms':>10}")
+    for mode, timings in results.items():
+        print(f"{mode:8} {len(timings):7d} {min(timings) * 1e3:10.1f} "
+              f"{statistics.median(timings) * 1e3:10.1f} {max(timings) * 1e3:10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Serialization time, compression CPU and bytes on the wire per endpoint.
+
+    python benchmarks/bench_responses.py [--rounds 20] [--output responses.json]
+
+Each endpoint is called once through the test client to capture a real
+payload, which is then re-serialized with the stdlib and orjson providers
+and compressed with every available encoding. "cached" is the cost of a
+compressed-body cache hit (hashing the body) for comparison. Runs against a
+temporary SQLite database, never the app's own users.db, with admission
+control off.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+_workdir = tempfile.mkdtemp(prefix="aqi-bench-responses-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'users.db')}")
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(_workdir, "model_registry"))
+os.environ.setdefault("MODEL_POLL_INTERVAL", "0")
+# Admission control would shed the setup requests; it is not what is measured
+with open(os.path.join(_workdir, "admission.json"), "w") as _f:
+    json.dump({"enabled": False}, _f)
+os.environ.setdefault("ADMISSION_CONFIG", _f.name)
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import app as aqi_app  # noqa: E402
+import compression  # noqa: E402
+from fast_json import OrjsonProvider, orjson  # noqa: E402
+
+# name -> (method, path, json body)
+ENDPOINTS = {
+    "aqi": ("GET", "/aqi/1", None),
+    "predict": ("POST", "/predict/1", {"username": "bench"}),
+    "history": ("POST", "/history", {"username": "bench"}),
+    "series": ("GET", "/series?resolution=daily", None),
+    "readings/stats": ("GET", "/readings/stats", None),
+    "run-notebook": ("POST", "/run-notebook", {"username": "bench", "month": 1}),
+}
+
+
+def median_time(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def capture_payloads(client):
+    client.post("/signup", json={"username": "bench", "password": "bench-password",
+                                 "category": "Old Age"})
+    for _ in range(10):
+        client.post("/predict/1", json={"username": "bench"})
+    payloads = {}
+    for name, (method, path, body) in ENDPOINTS.items():
+        response = client.open(path, method=method, json=body, headers={"Accept-Encoding": "identity"})
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.data[:200]!r}")
+        payloads[name] = response.get_json()
+    return payloads
+
+
+def bench_endpoint(payload, rounds):
+    flask_app = aqi_app.app
+    providers = {"json": DefaultJSONProvider(flask_app)}
+    if orjson is not None:
+        providers["orjson"] = OrjsonProvider(flask_app)
+    result = {"serialize_ms": {}, "compress_ms": {}, "bytes": {}}
+    with flask_app.app_context():
+        for name, provider in providers.items():
+            result["serialize_ms"][name] = median_time(lambda: provider.response(payload), rounds) * 1e3
+        body = providers["json"].response(payload).get_data()
+    result["bytes"]["identity"] = len(body)
+    for encoding in compression.available_encodings():
+        result["bytes"][encoding] = len(compression.compress(body, encoding))
+        result["compress_ms"][encoding] = median_time(
+            lambda: compression.compress(body, encoding), rounds) * 1e3
+        cache = compression.CompressedCache(64 * 1024 * 1024)
+        cache.get_or_compress(body, encoding)
+        result["compress_ms"][f"{encoding} cached"] = median_time(
+            lambda: cache.get_or_compress(body, encoding), rounds) * 1e3
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("-k", dest="keyword", default="", help="only endpoints containing this")
+    parser.add_argument("--output", help="write results as JSON here")
+    args = parser.parse_args(argv)
+
+    payloads = capture_payloads(aqi_app.app.test_client())
+    results = {name: bench_endpoint(payload, args.rounds)
+               for name, payload in payloads.items() if args.keyword in name}
+
+    encodings = compression.available_encodings()
+    columns = ([f"ser {p} ms" for p in ("json", "orjson")]
+               + [f"{e} ms" for e in encodings] + [f"{e} hit ms" for e in encodings]
+               + ["raw B"] + [f"{e} B" for e in encodings])
+    print(f"{'endpoint':15}" + "".join(f"{c:>14}" for c in columns))
+    for name, r in results.items():
+        values = ([r["serialize_ms"].get(p) for p in ("json", "orjson")]
+                  + [r["compress_ms"][e] for e in encodings]
+                  + [r["compress_ms"][f"{e} cached"] for e in encodings])
+        sizes = [r["bytes"]["identity"]] + [r["bytes"][e] for e in encodings]
+        print(f"{name:15}" + "".join(f"{v:14.3f}" if v is not None else f"{'-':>14}" for v in values)
+              + "".join(f"{v:14d}" for v in sizes))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "rounds": args.rounds,
+                       "endpoints": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""Replay the Flutter client's traffic against a local server and report latency.
+
+    python benchmarks/loadtest.py --concurrency 8 --duration 30 --output run.json
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 ...   # existing server
+
+Unless --url is given, the app is started under gunicorn (or the Flask dev
+server with --server flask) against a throwaway SQLite database, and --users
+accounts are created through /signup before the clock starts. Each client
+thread keeps one HTTP connection open and picks endpoints at random with the
+weights in TRAFFIC_MIX; the random seed makes runs repeatable. The JSON report
+holds throughput and p50/p95/p99 latency per endpoint, so two runs can be
+diffed directly.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+import http.client
+import urllib.parse
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Calls per session of the app in aqi_app/lib: the home page fetches /aqi
+# (main.dart), login.dart logs in, predictionpage.dart calls /check-user on
+# open and then /predict for a few months, runs the notebook once and opens
+# historypage.dart, which posts /history.
+TRAFFIC_MIX = {
+    "aqi": 1,
+    "login": 1,
+    "check-user": 1,
+    "predict": 3,
+    "run-notebook": 1,
+    "history": 1,
+}
+CATEGORIES = ["Lung Disease/Asthma", "Old Age", "Normal People"]
+PASSWORD = "loadtest-password"
+
+
+def build_request(endpoint, username, rng):
+    """(method, path, json body) for one call, shaped like the Flutter client's"""
+    month = rng.randint(1, 12)
+    if endpoint == "aqi":
+        return "GET", f"/aqi/{month}", None
+    if endpoint == "login":
+        return "POST", "/login", {"username": username, "password": PASSWORD}
+    if endpoint == "check-user":
+        return "POST", "/check-user", {"username": username}
+    if endpoint == "predict":
+        return "POST", f"/predict/{month}", {"username": username}
+    if endpoint == "run-notebook":
+        return "POST", "/run-notebook", {"username": username, "month": month}
+    if endpoint == "history":
+        return "POST", "/history", {"username": username}
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+class Client:
+    """One keep-alive connection, reopened after errors"""
+
+    def __init__(self, url, timeout):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "identity"}
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * q
+    lo = int(rank)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (rank - lo)
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / len(values) * 1000 if values else None,
+        "p50_ms": percentile(values, 0.50) * 1000 if values else None,
+        "p95_ms": percentile(values, 0.95) * 1000 if values else None,
+        "p99_ms": percentile(values, 0.99) * 1000 if values else None,
+        "max_ms": values[-1] * 1000 if values else None,
+    }
+
+
+def run_load(url, usernames, mix, concurrency, duration, requests_per_client, seed, timeout):
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+    results = {e: {"latencies": [], "statuses": {}, "errors": 0} for e in endpoints}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(url, timeout)
+        local = {e: {"latencies": [], "statuses": {}, "errors": 0} for e in endpoints}
+        sent = 0
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if requests_per_client and sent >= requests_per_client:
+                break
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, path, body = build_request(endpoint, rng.choice(usernames), rng)
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body)
+            except (http.client.HTTPException, OSError):
+                local[endpoint]["errors"] += 1
+                continue
+            finally:
+                sent += 1
+            local[endpoint]["latencies"].append(time.perf_counter() - start)
+            local[endpoint]["statuses"][status] = local[endpoint]["statuses"].get(status, 0) + 1
+        client.close()
+        with lock:
+            for e, r in local.items():
+                results[e]["latencies"].extend(r["latencies"])
+                results[e]["errors"] += r["errors"]
+                for code, count in r["statuses"].items():
+                    results[e]["statuses"][code] = results[e]["statuses"].get(code, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    report = {e: summarize(r["latencies"], r["statuses"], r["errors"], elapsed)
+              for e, r in results.items()}
+    all_latencies = [v for r in results.values() for v in r["latencies"]]
+    all_statuses = {}
+    for r in results.values():
+        for code, count in r["statuses"].items():
+            all_statuses[code] = all_statuses.get(code, 0) + count
+    report["all"] = summarize(all_latencies, all_statuses,
+                              sum(r["errors"] for r in results.values()), elapsed)
+    return report, elapsed
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(server, workers, port, env, extra_args=()):
+    if server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "--chdir", base_dir,
+               "-w", str(workers), "-b", f"127.0.0.1:{port}", "--timeout", "120",
+               "--log-level", "warning", *extra_args]
+    elif server == "flask":
+        cmd = [sys.executable, "-c",
+               f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    else:
+        cmd = [*server.split(), *extra_args]
+        cmd = [part.replace("{port}", str(port)) for part in cmd]
+    return subprocess.Popen(cmd, cwd=base_dir, env=env)
+
+
+def wait_until_ready(url, process, timeout=120):
+    client = Client(url, 5)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            client.request("GET", "/aqi/1")
+            client.close()
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout}s")
+
+
+def seed_users(url, count, prefix):
+    client = Client(url, 60)
+    usernames = [f"{prefix}{i}" for i in range(count)]
+    for i, username in enumerate(usernames):
+        status, body = client.request("POST", "/signup", {
+            "username": username, "password": PASSWORD, "category": CATEGORIES[i % len(CATEGORIES)]})
+        if status not in (201, 400):  # 400: already exists when reusing a server
+            raise RuntimeError(f"Seeding {username} failed: {status} {body[:200]!r}")
+    client.close()
+    return usernames
+
+
+def server_env(workdir):
+    """Environment for a server started by this script: its own database,
+    model registry and readings log"""
+    return dict(os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'users.db')}",
+                MODEL_REGISTRY_DIR=os.path.join(workdir, "model_registry"),
+                READINGS_LOG=os.path.join(workdir, "readings.csv"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--server", default="gunicorn",
+                        help="gunicorn, flask, or a full command line containing {port}")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds (0 = use --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="requests per client thread")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--mix", type=json.loads, default=TRAFFIC_MIX,
+                        help='endpoint weights as JSON, e.g. \'{"predict": 1}\'')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--label", default="", help="free-form run label stored in the report")
+    parser.add_argument("--output", default="loadtest.json")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.mix) - set(TRAFFIC_MIX)
+    if unknown:
+        parser.error(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+
+    process = None
+    workdir = None
+    url = args.url
+    try:
+        if url is None:
+            workdir = tempfile.TemporaryDirectory(prefix="aqi-loadtest-")
+            env = server_env(workdir.name)
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            process = start_server(args.server, args.workers, port, env)
+        wait_until_ready(url, process)
+        usernames = seed_users(url, args.users, prefix=f"loadtest{args.seed}_")
+
+        print(f"Running {args.concurrency} clients against {url} "
+              f"for {args.duration or args.requests} {'s' if args.duration else 'requests each'}")
+        report, elapsed = run_load(url, usernames, args.mix, args.concurrency,
+                                   args.duration, args.requests, args.seed, args.timeout)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if workdir is not None:
+            workdir.cleanup()
+
+    output = {
+        "label": args.label,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "url": args.url, "server": None if args.url else args.server,
+            "workers": None if args.url else args.workers, "concurrency": args.concurrency,
+            "duration": args.duration, "requests_per_client": args.requests,
+            "users": args.users, "mix": args.mix, "seed": args.seed,
+        },
+        "host": {"python": platform.python_version(), "platform": platform.platform(),
+                 "cpu_count": os.cpu_count()},
+        "elapsed_seconds": elapsed,
+        "endpoints": report,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(f"{'endpoint':14} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, r in report.items():
+        if not r["requests"] and not r["errors"]:
+            continue
+        fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+        print(f"{endpoint:14} {r['requests']:7d} {r['errors']:5d} {r['throughput_rps']:8.1f} "
+              f"{fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])}")
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Microbenchmarks for the chart functions and the request-history write path.
+
+    python benchmarks/microbench.py [--rounds 20] [--output micro.json] [-k heatmap]
+
+Output follows pytest-benchmark's layout (min/max/mean/stddev/median/IQR/OPS
+per benchmark, both as a table and as JSON) so results can be compared with
+tooling written for it. The database benchmarks run against a temporary
+SQLite file, never the app's own users.db.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import statistics
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+# Removed when the script exits
+_workdir = tempfile.TemporaryDirectory(prefix="aqi-microbench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir.name, 'users.db')}")
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(_workdir.name, "model_registry"))
+os.environ.setdefault("MODEL_POLL_INTERVAL", "0")
+os.environ.setdefault("READINGS_LOG", os.path.join(_workdir.name, "readings.csv"))
+
+import app as aqi_app  # noqa: E402
+import Updated_Visualization as vis  # noqa: E402
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def run_benchmark(fn, rounds, warmup):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    ordered = sorted(timings)
+    q1, _, q3 = statistics.quantiles(ordered, n=4) if len(ordered) > 1 else (ordered[0],) * 3
+    mean = statistics.fmean(timings)
+    return {
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": mean,
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "median": statistics.median(ordered),
+        "iqr": q3 - q1,
+        "ops": 1 / mean if mean else None,
+        "rounds": rounds,
+        "data": timings,
+    }
+
+
+# --------------------------------------------------------------- charts
+
+@benchmark("vis.plot_aqi_histogram")
+def bench_histogram():
+    vis.plot_aqi_histogram(1)
+
+
+@benchmark("vis.plot_aqi_trend")
+def bench_trend():
+    vis.plot_aqi_trend(1)
+
+
+@benchmark("vis.plot_aqi_heatmap")
+def bench_heatmap():
+    vis.plot_aqi_heatmap(1)
+
+
+@benchmark("vis.plot_pollutant_contribution")
+def bench_pollutants():
+    vis.plot_pollutant_contribution(1)
+
+
+# ------------------------------------------------------------- database
+
+def _bench_user():
+    with aqi_app.app.app_context():
+        user = aqi_app.User.query.filter_by(username="microbench").first()
+        if user is None:
+            user = aqi_app.User(username="microbench", password="x", category="Old Age")
+            aqi_app.db.session.add(user)
+            aqi_app.db.session.commit()
+        return user.id
+
+
+@benchmark("db.insert_aqi_request")
+def bench_db_write():
+    """The /predict write: one AQIRequest row and a commit"""
+    with aqi_app.app.app_context():
+        aqi_app.db.session.add(aqi_app.AQIRequest(user_id=_user_id, month_index=1, aqi_value=338))
+        aqi_app.db.session.commit()
+
+
+@benchmark("db.history_query")
+def bench_db_history():
+    with aqi_app.app.app_context():
+        aqi_app.AQIRequest.query.filter_by(user_id=_user_id)\
+            .order_by(aqi_app.AQIRequest.timestamp.desc())\
+            .limit(10).all()
+
+
+_user_id = None
+
+
+def main(argv=None):
+    global _user_id
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("-k", dest="keyword", default="", help="only run benchmarks containing this")
+    parser.add_argument("--output", help="write pytest-benchmark style JSON here")
+    args = parser.parse_args(argv)
+
+    _user_id = _bench_user()
+    results = []
+    for name, fn in BENCHMARKS.items():
+        if args.keyword not in name:
+            continue
+        stats = run_benchmark(fn, args.rounds, args.warmup)
+        results.append({"name": name, "fullname": f"benchmarks/microbench.py::{name}", "stats": stats})
+
+    print(f"{'Name':34} {'Min (ms)':>10} {'Max (ms)':>10} {'Mean (ms)':>10} {'StdDev':>9} "
+          f"{'Median':>9} {'IQR':>8} {'OPS':>9}")
+    for r in results:
+        s = r["stats"]
+        print(f"{r['name']:34} {s['min'] * 1e3:10.3f} {s['max'] * 1e3:10.3f} {s['mean'] * 1e3:10.3f} "
+              f"{s['stddev'] * 1e3:9.3f} {s['median'] * 1e3:9.3f} {s['iqr'] * 1e3:8.3f} {s['ops']:9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "machine_info": {"python_version": platform.python_version(),
+                                 "platform": platform.platform(), "cpu_count": os.cpu_count()},
+                "datetime": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "benchmarks": results,
+            }, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Chart code shared by Updated_Visualization.py (the /run-notebook PNGs) and
+the report notebook, so both draw the same chart from the same columns.
+
+Only pyplot is imported here; the caller picks the backend (Agg in the app,
+inline in the notebook kernel).
+"""
+import matplotlib.pyplot as plt
+
+
+def pollutant_contribution(pollutant_totals):
+    """The pollutant sums worth a pie slice: zero and NaN totals are dropped"""
+    return pollutant_totals[pollutant_totals > 0]
+
+
+def draw_pollutant_contribution(pollutant_sums, month):
+    plt.figure(figsize=(8, 8))
+    plt.pie(pollutant_sums, labels=pollutant_sums.index, autopct="%1.1f%%",
+            startangle=140, colors=plt.cm.Paired.colors)
+    plt.title(f"Pollutant Contribution to AQI for Month {month} Across All Years")
@@ -0,0 +1,144 @@
+"""Content-negotiated gzip/brotli compression of responses.
+
+Responses of a compressible type (JSON, text) larger than COMPRESS_MIN_SIZE
+bytes are compressed with the best encoding the client accepts: brotli when
+the optional `brotli` package is installed and the client sends `br`,
+otherwise gzip. Small responses are sent as they are; compressing them costs
+more CPU than it saves on the wire.
+
+Endpoints in CACHED_ENDPOINTS return the same body for the same input (the
+/run-notebook charts for a month, /series for a range), so their compressed
+bodies are kept in an LRU cache keyed by a hash of the uncompressed body and
+the encoding. A repeated chart payload is then hashed, not recompressed. The
+cache holds at most COMPRESS_CACHE_BYTES of compressed data per worker.
+"""
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+from instrumentation import span
+
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+CACHE_BYTES = int(os.getenv("COMPRESS_CACHE_BYTES", str(32 * 1024 * 1024)))
+MIMETYPES = {"application/json", "text/html", "text/plain", "text/csv"}
+# Flask endpoint names whose bodies are worth caching compressed
+CACHED_ENDPOINTS = {"get_aqi_graphs", "get_report", "get_series", "readings_stats",
+                    "debug_dataset"}
+
+
+def available_encodings():
+    """Supported encodings, most preferred first"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding, encodings=None):
+    """The supported encoding the Accept-Encoding header ranks highest, or None"""
+    encodings = encodings or available_encodings()
+    quality = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            quality[coding] = q
+    best, best_q = None, 0.0
+    for coding in encodings:
+        q = quality.get(coding, quality.get("*", 0.0))
+        if q > best_q:  # ties keep the earlier, preferred encoding
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """LRU of compressed bodies, bounded by total compressed size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, body, encoding):
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = compress(body, encoding)
+        if len(data) > self.max_bytes:
+            return data
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self.size += len(data)
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+cache = CompressedCache(CACHE_BYTES)
+
+
+def _after_request(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.calculate_content_length() < MIN_SIZE:
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    with span("compress"):
+        if request.endpoint in CACHED_ENDPOINTS:
+            data = cache.get_or_compress(body, encoding)
+        else:
+            data = compress(body, encoding)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    """Compress responses; call after instrumentation.init_app so latency includes it"""
+    app.after_request(_after_request)
+    app.extensions["compression"] = cache
+    return cache
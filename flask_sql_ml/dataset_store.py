@@ -0,0 +1,339 @@
+import os
+import io
+import csv
+import bisect
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+from range_queries import RangeAggregates
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still single writes in 'a' mode
+    fcntl = None
+
+POLLUTANT_COLUMNS = ['PM2.5_AQI', 'PM10_AQI', 'NO2_AQI', 'CO_AQI', 'O3_AQI']
+ROLLING_WINDOWS = (7, 30)
+# How far past today a reading may be dated, for stations a timezone ahead
+MAX_FUTURE_SKEW = datetime.timedelta(days=1)
+
+
+class RunningMean:
+    """Welford's online mean/variance"""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class RollingStats:
+    """Aggregates behind the charts, maintained one reading at a time.
+
+    * trailing 7/30-day mean AQI (running sum over the readings in the window)
+    * mean/variance of AQI per (month, year)
+    * per-month pollutant sums, from which the contribution shares follow
+    """
+
+    def __init__(self, pollutant_columns=POLLUTANT_COLUMNS, windows=ROLLING_WINDOWS):
+        self.pollutant_columns = list(pollutant_columns)
+        self.windows = tuple(windows)
+        self._window_entries = {days: [] for days in self.windows}
+        self._window_sums = {days: 0.0 for days in self.windows}
+        self.latest_day = None
+        self.monthly = {}
+        self.pollutant_sums = {}
+        self.count = 0
+
+    def update(self, day, year, month, aqi, pollutants):
+        """Fold one reading in; day is a datetime.date"""
+        self.count += 1
+        self.monthly.setdefault(month, {}).setdefault(year, RunningMean()).update(aqi)
+        if month not in self.pollutant_sums:
+            self.pollutant_sums[month] = np.zeros(len(self.pollutant_columns))
+        self.pollutant_sums[month] += pollutants
+
+        ordinal = day.toordinal()
+        if self.latest_day is None or ordinal > self.latest_day:
+            self.latest_day = ordinal
+        for days in self.windows:
+            entries = self._window_entries[days]
+            cutoff = self.latest_day - days + 1
+            if ordinal >= cutoff:
+                bisect.insort(entries, (ordinal, aqi))
+                self._window_sums[days] += aqi
+            # Entries are kept sorted by day, so expired ones are at the front
+            while entries and entries[0][0] < cutoff:
+                self._window_sums[days] -= entries.pop(0)[1]
+
+    def rolling_mean(self, days):
+        entries = self._window_entries[days]
+        return self._window_sums[days] / len(entries) if entries else None
+
+    def yearly_means(self, month):
+        """Mean AQI of the given month for each year, indexed by year"""
+        by_year = self.monthly.get(month, {})
+        years = sorted(by_year)
+        return pd.Series([by_year[y].mean for y in years], index=pd.Index(years, name="year"),
+                         name="AQI", dtype=float)
+
+    def pollutant_totals(self, month):
+        sums = self.pollutant_sums.get(month, np.zeros(len(self.pollutant_columns)))
+        return pd.Series(sums, index=self.pollutant_columns)
+
+    def pollutant_shares(self, month):
+        totals = self.pollutant_totals(month)
+        grand_total = totals.sum()
+        return totals / grand_total if grand_total > 0 else totals
+
+    def summary(self):
+        latest = datetime.date.fromordinal(self.latest_day).isoformat() if self.latest_day else None
+        return {
+            "readings": self.count,
+            "latest_date": latest,
+            "rolling_mean_aqi": {f"{days}d": self.rolling_mean(days) for days in self.windows},
+            "monthly_mean_aqi": {
+                month: {year: stats.mean for year, stats in sorted(by_year.items())}
+                for month, by_year in sorted(self.monthly.items())
+            },
+            "pollutant_shares": {
+                month: self.pollutant_shares(month).to_dict() for month in sorted(self.pollutant_sums)
+            },
+        }
+
+
+class DatasetStore:
+    """The AQI dataset plus readings appended while the service is running.
+
+    The dataset CSV itself is never written. New readings go to a separate
+    append log (same columns, one header line), and every worker tails that
+    log from the last byte offset it has seen, so readings posted to one
+    gunicorn worker reach the others without a reload. Each new row is
+    folded into RollingStats as it is read; nothing is recomputed over the
+    full dataset.
+
+    The CSV is read on first use rather than on construction, so importing
+    the app (or a worker that never touches the data) does not pay for it.
+    """
+
+    def __init__(self, path, log_path=None, pollutant_columns=POLLUTANT_COLUMNS):
+        self.path = path
+        self.log_path = log_path
+        self.pollutant_columns = list(pollutant_columns)
+        self.stats = RollingStats(self.pollutant_columns)
+        self.version = 0
+        self._lock = threading.RLock()
+        self._pending = []
+        self._offset = 0
+        self._columns = []
+        self._index_column = None
+        self._next_index = 0
+        self._range_aggregates = None
+        self._unindexed = []  # rows read since the range index was last brought up to date
+        self._df = None
+
+    def _load(self):
+        """Read the CSV and fold it into the stats, once; callers hold the lock"""
+        if self._df is not None:
+            return
+        try:
+            df = pd.read_csv(self.path)
+            self._columns = df.columns.tolist()
+            if self._columns[0].startswith("Unnamed"):
+                self._index_column = self._columns[0]  # the CSV's unnamed row number
+            print(f"Successfully loaded AQI dataset from {self.path}")
+        except Exception as e:
+            print(f"Error loading AQI dataset: {e}")
+            self._df = pd.DataFrame()
+            return
+
+        self._next_index = len(df)
+        ordered = df.sort_values("Date", kind="stable")
+        for day, year, month, aqi, pollutants in zip(
+                ordered["Date"], ordered["year"], ordered["month"], ordered["AQI"],
+                ordered[self.pollutant_columns].to_numpy(dtype=float)):
+            self.stats.update(datetime.date.fromisoformat(day), int(year), int(month),
+                              float(aqi), pollutants)
+        self._df = df
+
+    @property
+    def empty(self):
+        self.refresh()
+        with self._lock:
+            return self._df.empty and not self._pending
+
+    def describe(self):
+        """Columns and row count, without building the combined frame"""
+        self.refresh()
+        with self._lock:
+            return {"columns": list(self._columns), "rows": len(self._df) + len(self._pending)}
+
+    def _apply(self, row):
+        self.stats.update(datetime.date.fromisoformat(row["Date"]), row["year"], row["month"],
+                          row["AQI"], np.array([row[c] for c in self.pollutant_columns]))
+        self._pending.append(row)
+        if self._range_aggregates is not None:
+            self._unindexed.append(row)
+        self._next_index += 1
+        self.version += 1
+
+    def refresh(self):
+        """Pick up rows appended to the log since the last call. Returns the count.
+        The first call also loads the dataset."""
+        with self._lock:
+            self._load()
+            if not self._columns or not self.log_path:
+                return 0
+            try:
+                if os.path.getsize(self.log_path) <= self._offset:
+                    return 0
+                with open(self.log_path, "rb") as f:
+                    f.seek(self._offset)
+                    chunk = f.read()
+            except OSError:
+                return 0
+            complete = chunk.rfind(b"\n") + 1  # ignore a line that is still being written
+            if not complete:
+                return 0
+            self._offset += complete
+
+            added = 0
+            for values in csv.reader(io.StringIO(chunk[:complete].decode("utf-8"))):
+                if not values or values == self._columns:  # the log's header
+                    continue
+                row = dict(zip(self._columns, values))
+                row["year"] = int(row["year"])
+                row["month"] = int(row["month"])
+                for column in self.pollutant_columns + ["AQI"]:
+                    row[column] = float(row[column])
+                if self._index_column:
+                    row[self._index_column] = int(row[self._index_column])
+                self._apply(row)
+                added += 1
+            return added
+
+    def append(self, readings):
+        """Validate readings and append them to the readings log.
+
+        Each reading needs a 'Date' (YYYY-MM-DD), no later than tomorrow, and
+        every pollutant sub-index; 'AQI' defaults to the highest sub-index. Raises ValueError
+        on the first invalid reading, before anything is written.
+        """
+        self.refresh()
+        if not self._columns:
+            raise ValueError("Dataset not loaded")
+        if not self.log_path:
+            raise ValueError("No readings log configured")
+        rows = [self._normalize(reading) for reading in readings]
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        with self._lock, open(self.log_path, "ab+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Catch up with other workers' rows while holding the file lock,
+                # so the row numbers below are not handed out twice
+                self.refresh()
+                index = self._next_index
+                lines = io.StringIO()
+                writer = csv.writer(lines, lineterminator="\n")
+                f.seek(0, os.SEEK_END)
+                if not f.tell():
+                    writer.writerow(self._columns)
+                for row in rows:
+                    if self._index_column:
+                        row[self._index_column] = index
+                        index += 1
+                    writer.writerow([row[c] for c in self._columns])
+                f.write(lines.getvalue().encode("utf-8"))
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            self.refresh()
+        return len(rows)
+
+    def _normalize(self, reading):
+        if not isinstance(reading, dict):
+            raise ValueError("Each reading must be a JSON object")
+        raw_date = reading.get("Date") or reading.get("date")
+        try:
+            day = datetime.date.fromisoformat(str(raw_date))
+        except ValueError:
+            raise ValueError(f"Invalid or missing Date: {raw_date!r}")
+        if day > datetime.date.today() + MAX_FUTURE_SKEW:
+            raise ValueError(f"Date {day.isoformat()} is in the future")
+
+        row = {"Date": day.isoformat(), "year": day.year, "month": day.month}
+        for column in self.pollutant_columns:
+            if reading.get(column) is None:
+                raise ValueError(f"Missing {column}")
+            try:
+                value = float(reading[column])
+            except (TypeError, ValueError):
+                raise ValueError(f"{column} must be a number")
+            if not np.isfinite(value) or value < 0:
+                raise ValueError(f"{column} must be a non-negative number")
+            row[column] = value
+        try:
+            row["AQI"] = float(reading.get("AQI", max(row[c] for c in self.pollutant_columns)))
+        except (TypeError, ValueError):
+            raise ValueError("AQI must be a number")
+        if not np.isfinite(row["AQI"]) or row["AQI"] < 0:
+            raise ValueError("AQI must be a non-negative number")
+        return row
+
+    def yearly_means(self, month):
+        self.refresh()
+        with self._lock:
+            return self.stats.yearly_means(month)
+
+    def pollutant_totals(self, month):
+        self.refresh()
+        with self._lock:
+            return self.stats.pollutant_totals(month)
+
+    def summary(self):
+        self.refresh()
+        with self._lock:
+            return self.stats.summary()
+
+    def range_aggregates(self):
+        """Prefix-sum/sparse-table index over the current data. New readings
+        are appended to it; it is only rebuilt when one is dated before the
+        last indexed reading."""
+        self.refresh()
+        with self._lock:
+            index = self._range_aggregates
+            if index is not None and self._unindexed:
+                index = index.extended(pd.DataFrame(self._unindexed, columns=self._columns))
+            if index is None:
+                index = RangeAggregates(self.frame(), self.pollutant_columns)
+            self._range_aggregates = index
+            self._unindexed = []
+            return index
+
+    def frame(self):
+        """The full dataset including every reading appended so far"""
+        self.refresh()
+        with self._lock:
+            if self._pending:
+                appended = pd.DataFrame(self._pending, columns=self._columns)
+                self._df = pd.concat([self._df, appended], ignore_index=True)
+                self._pending = []
+            return self._df
@@ -0,0 +1,228 @@
+"""Ensemble scoring across the exported tree models.
+
+    ensemble = Ensemble({"rf": rf_registry, "xgb": xgb_registry}, budget_ms=50)
+    result = ensemble.predict(rows)   # rows: list of {feature: value}
+
+Every member scores the whole batch on its own thread. scikit-learn's tree
+traversal and XGBoost's predictor both release the GIL, so the members run
+side by side and the batch costs about as much as the slowest member, not the
+sum. Members still running when the latency budget runs out are skipped for
+this batch (their thread finishes in the background); a member whose thread
+is still busy with an earlier batch is skipped too, so each member has at
+most one straggler and a batch never queues behind them. At least one member
+always answers: if every member is busy, the fastest is scored on the
+calling thread. When the members together usually take less than inline_ms,
+handing work to threads costs more than it saves, so they are scored one
+after another on the calling thread, skipping the rest once the budget is
+spent.
+
+The point estimate is the members' mean, weighted by inverse validation MSE
+from their registry manifests when every member has one. The uncertainty
+band adds two things around the ensemble estimate: the spread of the forest's
+individual trees (the 5th-95th percentile of the per-tree predictions,
+measured from their mean) and the members' disagreement (the largest distance
+from any member's prediction to the estimate). The band always contains the
+estimate. A lone member that is not a forest has neither, so no band is
+given ("band_source": "unavailable").
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from instrumentation import observe, PHASE_METRIC
+from model_registry import is_forest
+
+BAND_QUANTILES = (5, 95)
+MAX_BATCH = 1000
+INLINE_MS = float(os.getenv("ENSEMBLE_INLINE_MS", "2"))
+
+
+def band(point, predictions, trees=None, centre=None):
+    """(lower, upper) around point from the tree spread and member disagreement.
+
+    predictions has one row per answering member; trees/centre are the
+    forest's per-tree predictions and their mean, if a forest answered.
+    """
+    gap = np.abs(predictions - point).max(axis=0)
+    below = above = 0.0
+    if trees is not None:
+        low, high = np.percentile(trees, BAND_QUANTILES, axis=0)
+        # A skewed forest can put its mean outside its own percentiles
+        below, above = np.maximum(centre - low, 0.0), np.maximum(high - centre, 0.0)
+    return point - below - gap, point + above + gap
+
+
+class Ensemble:
+    def __init__(self, registries, budget_ms=None, max_workers=None, inline_ms=INLINE_MS):
+        self.registries = dict(registries)
+        self.budget_ms = budget_ms
+        self.inline_ms = inline_ms
+        # Spare threads so a member still running past the budget does not
+        # hold up the next batch
+        self._executor = ThreadPoolExecutor(max_workers or 2 * len(self.registries),
+                                            thread_name_prefix="ensemble")
+        self._latency_ms = {}  # name -> moving average, for status()
+        self._skipped = {name: 0 for name in self.registries}
+        self._busy = set()  # members with a thread still scoring an earlier batch
+        self._lock = threading.Lock()
+
+    def members(self):
+        """(name, LoadedModel) for every member with a live model"""
+        loaded = [(name, registry.current()) for name, registry in self.registries.items()]
+        return [(name, model) for name, model in loaded if model is not None]
+
+    def _score(self, name, loaded, rows):
+        start = time.perf_counter()
+        X = np.array([[float(row[f]) for f in loaded.features] for row in rows])
+        if is_forest(loaded.model):
+            trees = loaded.predict_trees(X)
+            result = {"prediction": trees.mean(axis=0), "trees": trees}
+        else:
+            result = {"prediction": np.asarray(loaded.predict(X), dtype=float)}
+        elapsed = time.perf_counter() - start
+        observe(PHASE_METRIC, (("phase", f"ensemble_{name}"),), elapsed)
+        with self._lock:
+            previous = self._latency_ms.get(name)
+            ms = elapsed * 1000
+            self._latency_ms[name] = ms if previous is None else 0.8 * previous + 0.2 * ms
+        result["ms"] = elapsed * 1000
+        return result
+
+    def _score_parallel(self, members, rows, budget_ms):
+        """name -> (status, result or exception), members on pool threads"""
+        with self._lock:
+            idle = [(name, loaded) for name, loaded in members if name not in self._busy]
+            self._busy.update(name for name, _ in idle)
+        outcomes = {name: ("skipped", None) for name, _ in members}
+        if not idle:
+            # Every member is still on an earlier batch: no new thread, score
+            # the usually fastest one here
+            name, loaded = min(members, key=lambda m: self._latency_ms.get(m[0], 0.0))
+            try:
+                outcomes[name] = ("ok", self._score(name, loaded, rows))
+            except Exception as e:
+                outcomes[name] = ("error", e)
+            return outcomes
+
+        futures = {}
+        for name, loaded in idle:
+            future = self._executor.submit(self._score, name, loaded, rows)
+            future.add_done_callback(lambda _, name=name: self._finished(name))
+            futures[future] = name
+        done, pending = wait(futures, timeout=budget_ms / 1000 if budget_ms else None)
+        if not done:
+            # Nothing finished in budget: take whichever member answers first
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        for future, name in futures.items():
+            if future in pending:
+                outcomes[name] = ("skipped", None)
+            elif future.exception() is not None:
+                outcomes[name] = ("error", future.exception())
+            else:
+                outcomes[name] = ("ok", future.result())
+        return outcomes
+
+    def _finished(self, name):
+        with self._lock:
+            self._busy.discard(name)
+
+    def _score_inline(self, members, rows, start, budget_ms):
+        """name -> (status, result or exception), members on this thread"""
+        outcomes = {}
+        for name, loaded in members:
+            answered = any(status == "ok" for status, _ in outcomes.values())
+            if answered and budget_ms and (time.perf_counter() - start) * 1000 >= budget_ms:
+                outcomes[name] = ("skipped", None)
+                continue
+            try:
+                outcomes[name] = ("ok", self._score(name, loaded, rows))
+            except Exception as e:
+                outcomes[name] = ("error", e)
+        return outcomes
+
+    def predict(self, rows, budget_ms=None):
+        """Score a batch; returns predictions, bands and a per-member breakdown"""
+        members = self.members()
+        if not members:
+            raise RuntimeError("No ensemble member has a model loaded")
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        start = time.perf_counter()
+        with self._lock:
+            expected = [self._latency_ms.get(name) for name, _ in members]
+        if None not in expected and sum(expected) < self.inline_ms:
+            outcomes = self._score_inline(members, rows, start, budget_ms)
+        else:
+            outcomes = self._score_parallel(members, rows, budget_ms)
+
+        breakdown = {}
+        answers = {}
+        for name, loaded in members:
+            status, value = outcomes[name]
+            entry = {"version": loaded.version, "status": status}
+            if status == "skipped":
+                with self._lock:
+                    self._skipped[name] += 1
+            elif status == "error":
+                entry["error"] = str(value)
+            else:
+                answers[name] = value
+                entry["ms"] = value["ms"]
+            breakdown[name] = entry
+        if not answers:
+            raise RuntimeError("Every ensemble member failed: " +
+                               "; ".join(f"{n}: {e.get('error')}" for n, e in breakdown.items()))
+
+        names = list(answers)
+        predictions = np.stack([answers[n]["prediction"] for n in names])
+        loaded_by_name = dict(members)
+        mses = [(loaded_by_name[n].manifest.get("metrics") or {}).get("mse") for n in names]
+        if all(mses):
+            weights = np.array([1 / m for m in mses])
+        else:
+            weights = np.ones(len(names))
+        weights = weights / weights.sum()
+        point = weights @ predictions
+
+        forest = next((n for n in names if "trees" in answers[n]), None)
+        if forest is not None:
+            lower, upper = (b.tolist() for b in band(point, predictions, answers[forest]["trees"],
+                                                     answers[forest]["prediction"]))
+            band_source = forest
+        elif len(names) > 1:
+            lower, upper = (b.tolist() for b in band(point, predictions))
+            band_source = "members"
+        else:
+            # One member and no trees: a zero-width band would claim certainty
+            lower = upper = [None] * len(rows)
+            band_source = "unavailable"
+
+        return {
+            "predictions": [
+                {"aqi": aqi, "lower": low, "upper": high}
+                for aqi, low, high in zip(point.tolist(), lower, upper)
+            ],
+            "members": breakdown,
+            "weights": {n: float(w) for n, w in zip(names, weights)},
+            "band": None if band_source == "unavailable" else
+            {"source": forest, "quantiles": list(BAND_QUANTILES), "members": names},
+            "band_source": band_source,
+            "budget_ms": budget_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    def status(self):
+        with self._lock:
+            latency = dict(self._latency_ms)
+            skipped = dict(self._skipped)
+        return {
+            "budget_ms": self.budget_ms,
+            "members": {
+                name: {"active_version": registry.current().version if registry.current() else None,
+                       "avg_ms": latency.get(name), "skipped": skipped[name]}
+                for name, registry in self.registries.items()
+            },
+            "pid": os.getpid(),
+        }
@@ -0,0 +1,67 @@
+"""Pluggable JSON provider for the Flask app.
+
+JSON_PROVIDER picks the encoder behind jsonify() and request.get_json():
+"orjson" (the default when it is installed) or "json" for Flask's stdlib
+provider. The orjson provider keeps Flask's conventions: sorted keys,
+HTTP dates for datetimes, str() for Decimal/UUID, dataclasses as dicts,
+indented output in debug mode. It writes bytes straight into the response
+instead of building an intermediate str, and serializes numpy arrays and
+scalars natively. NaN/Infinity come out as null rather than the invalid
+JSON tokens the stdlib emits.
+"""
+import os
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib provider
+    orjson = None
+
+from instrumentation import span
+
+PROVIDERS = ("orjson", "json")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # datetimes and dataclasses go through Flask's _default so the output
+    # matches the stdlib provider
+    base_options = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def _options(self, indent=False):
+        options = self.base_options
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default,
+                            option=self._options(kwargs.get("indent"))).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        with span("serialize"):
+            body = orjson.dumps(obj, default=_default,
+                                option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app, name=None):
+    """Install the provider named by JSON_PROVIDER (default: orjson if available)"""
+    name = name or os.getenv("JSON_PROVIDER", "orjson" if orjson else "json")
+    if name not in PROVIDERS:
+        raise ValueError(f"JSON_PROVIDER must be one of {', '.join(PROVIDERS)}, got {name!r}")
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = DefaultJSONProvider(app)
+    return app.json
@@ -0,0 +1,103 @@
+"""Lag and sliding-window features shared by the training code and the app.
+
+Everything here is built on one C-contiguous float32 buffer of shape
+(rows, features). Lag matrices and model windows are strided views over that
+buffer (numpy's sliding_window_view), so building them costs O(1) memory no
+matter how many lags or how wide the window is. Callers that need a dense
+2-D matrix, e.g. to hand to XGBoost, copy exactly once at that point.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+POLLUTANTS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+
+
+def to_buffer(frame, columns=POLLUTANTS, dtype=np.float32):
+    """Return the given columns as one contiguous (rows, features) array"""
+    return np.ascontiguousarray(frame[list(columns)].to_numpy(dtype=dtype))
+
+
+def lag_matrix(buffer, lags):
+    """Lagged copies of every feature as a view of shape (rows - lags, features, lags).
+
+    out[i, f, k - 1] is feature f at row i + lags - k, i.e. row i of the
+    result lines up with row i + lags of the buffer, the same alignment the
+    XGBoost notebook gets from shift(k) once the leading NaN rows are dropped.
+    """
+    if not 1 <= lags < len(buffer):
+        raise ValueError(f"lags must be between 1 and {len(buffer) - 1}, got {lags}")
+    windows = sliding_window_view(buffer, lags + 1, axis=0)
+    return windows[:, :, -2::-1]
+
+
+def lag_frame(buffer, lags, columns=POLLUTANTS, index=None):
+    """Dense DataFrame with '<col>_lag<k>' columns, matching the notebook layout"""
+    lagged = lag_matrix(buffer, lags)
+    names = [f"{col}_lag{k}" for col in columns for k in range(1, lags + 1)]
+    dense = lagged.reshape(len(lagged), -1)  # the single copy
+    if index is not None:
+        index = index[lags:]
+    return pd.DataFrame(dense, columns=names, index=index)
+
+
+def sliding_windows(features, target, window_size):
+    """Model windows as views, equivalent to the notebook's create_sequences.
+
+    Returns (X, y) with X of shape (rows - window_size, window_size, features)
+    and y[i] the target that follows window X[i].
+    """
+    if not 1 <= window_size < len(features):
+        raise ValueError(f"window_size must be between 1 and {len(features) - 1}, got {window_size}")
+    windows = sliding_window_view(features, window_size, axis=0)[:-1]
+    return windows.transpose(0, 2, 1), target[window_size:]
+
+
+class OnlineWindow:
+    """Fixed-size window of the most recent readings for online inference.
+
+    Readings are written twice into a buffer of 2 * window_size rows, so the
+    latest window is always one contiguous slice and append() touches a
+    single row instead of shifting the whole window (np.roll in the CNN-LSTM
+    notebook).
+    """
+
+    def __init__(self, window_size, n_features, dtype=np.float32):
+        self.window_size = window_size
+        self.n_features = n_features
+        self._buffer = np.zeros((2 * window_size, n_features), dtype=dtype)
+        self._pos = 0
+        self.count = 0
+
+    @classmethod
+    def from_buffer(cls, buffer, window_size):
+        online = cls(window_size, buffer.shape[1], dtype=buffer.dtype)
+        online.extend(buffer[-window_size:])
+        return online
+
+    def append(self, reading):
+        row = np.asarray(reading, dtype=self._buffer.dtype)
+        self._buffer[self._pos] = row
+        self._buffer[self._pos + self.window_size] = row
+        self._pos = (self._pos + 1) % self.window_size
+        self.count += 1
+
+    def extend(self, readings):
+        for reading in readings:
+            self.append(reading)
+
+    @property
+    def ready(self):
+        return self.count >= self.window_size
+
+    def window(self):
+        """The last window_size readings, oldest first, as a read-only view"""
+        view = self._buffer[self._pos:self._pos + self.window_size]
+        view.flags.writeable = False
+        return view
+
+    def lags(self, lags):
+        """Lag features for the next (not yet observed) row, shape (features, lags)"""
+        if lags > self.window_size:
+            raise ValueError(f"lags must be at most {self.window_size}, got {lags}")
+        return self.window()[:-lags - 1:-1].T
@@ -0,0 +1,14 @@
+"""gunicorn settings for the AQI app, picked up from the working directory.
+
+    gunicorn app:app                    # from flask_sql_ml/
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_exit(server, worker):
+    """Drop the exited worker's metrics snapshot so /metrics stops merging it"""
+    import instrumentation
+    instrumentation.remove_worker_files(worker.pid)
@@ -0,0 +1,114 @@
+"""Request handling shared by app.py (Flask) and async_app.py (Quart).
+
+The functions here take plain values (the parsed JSON body, a user's
+category, database rows) and return (body, status) pairs or plain values, so
+the two apps only differ in how they read the request, reach the database
+and build the response.
+"""
+import datetime
+import traceback
+
+import advice
+import Updated_Visualization as vis
+
+# AQI Dataset (Mock Data)
+aqidata = advice.AQI_BY_MONTH
+
+
+def validate_json(payload, required_fields):
+    if not payload:
+        return False
+    return all(field in payload and payload[field] for field in required_fields)
+
+
+def month_error(index):
+    """Error response for a month index outside 1-12, else None"""
+    if not 1 <= index <= len(aqidata):
+        return {'error': 'Invalid month index (1-12)'}, 400
+    return None
+
+
+def month_aqi(index, city=None):
+    """The city's latest yearly mean AQI for the month, or None without data.
+
+    No city means vis.DEFAULT_CITY, so /aqi/3 and /aqi/3?city=delhi agree.
+    The table above is used only when the default dataset has nothing for
+    the month (e.g. Final_Dataset.csv is missing).
+    """
+    dataset = vis.dataset_for(vis.DEFAULT_CITY if city is None else city)
+    means = dataset.yearly_means(index)
+    if means.empty:
+        return aqidata[index - 1] if dataset is vis.store else None
+    return int(round(means.iloc[-1]))
+
+
+def no_data(index):
+    return {'error': f'No AQI data for month {index}'}, 404
+
+
+def unknown_city(e):
+    return {'error': f'Unknown city: {e.args[0]}'}, 404
+
+
+def aqi_lookup(index, city=None):
+    """GET /aqi/<index>"""
+    error = month_error(index)
+    if error:
+        return error
+    aqi_value = month_aqi(index, city)
+    if aqi_value is None:
+        return no_data(index)
+    return {'month_index': index, 'aqi_value': aqi_value}, 200
+
+
+def prediction(index, aqi_value, category):
+    """Body of a successful POST /predict/<index>"""
+    solutions = advice.solutions_for(aqi_value)
+    return {
+        'month_index': index,
+        'aqi_value': aqi_value,
+        'solution': solutions.get(category, 'No specific solution available.')
+    }
+
+
+def history(records):
+    """Body of POST /history from (month_index, aqi_value, timestamp) rows"""
+    return {'history': [{
+        'month_index': month_index,
+        'aqi_value': aqi_value,
+        'timestamp': timestamp.isoformat() if isinstance(timestamp, datetime.datetime)
+        else datetime.datetime.fromisoformat(timestamp).isoformat()
+    } for month_index, aqi_value, timestamp in records]}
+
+
+def visualization_request(data):
+    """(month, city) from a /run-notebook body; raises ValueError if invalid"""
+    if not data or 'month' not in data:
+        raise ValueError("Month parameter is required")
+    return int(data.get("month")), data.get("city")
+
+
+def add_readings(data):
+    """POST /readings, after the caller has checked the admin token"""
+    if isinstance(data, dict) and 'readings' in data:
+        data = data['readings']
+    readings = data if isinstance(data, list) else [data]
+    if not data or not readings:
+        return {'error': 'At least one reading is required'}, 400
+
+    try:
+        accepted = vis.store.append(readings)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        traceback.print_exc()
+        return {'error': f'Failed to store readings: {str(e)}'}, 500
+
+    stats = vis.store.summary()
+    return {
+        'accepted': accepted,
+        'readings': stats['readings'],
+        'latest_date': stats['latest_date'],
+        'rolling_mean_aqi': stats['rolling_mean_aqi']
+    }, 201
+
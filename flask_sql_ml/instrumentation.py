@@ -0,0 +1,199 @@
+"""Latency histograms for routes and internal phases, exported as Prometheus text.
+
+    with span("render"):
+        ...
+
+Each worker keeps its own counters. When PROMETHEUS_MULTIPROC_DIR is set,
+workers also write a snapshot of their counters to that directory (at most
+once per flush interval, and whenever /metrics is scraped), and /metrics
+merges every worker's snapshot, so a scrape that lands on any gunicorn worker
+sees the whole server. Snapshots are named by pid and start time, so a new
+worker that reuses a dead one's pid never overwrites it, and gunicorn.conf.py
+deletes a worker's snapshot when it exits. Empty the directory before
+(re)starting gunicorn, as with prometheus_client's multiprocess mode.
+"""
+import os
+import json
+import time
+import bisect
+import threading
+
+from flask import g, request
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+REQUEST_METRIC = "aqi_http_request_duration_seconds"
+PHASE_METRIC = "aqi_phase_duration_seconds"
+HELP = {
+    REQUEST_METRIC: "Request latency by route, method and status",
+    PHASE_METRIC: "Time spent in internal phases (dataset slice, render, DB commit, ...)",
+}
+
+_perf_counter = time.perf_counter
+_lock = threading.Lock()
+# (metric, labels) -> [bucket counts..., +Inf count, sum]
+_series = {}
+_multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+_flush_interval = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+_last_flush = 0.0
+_snapshot_file = (None, None)  # (pid, file name) of this process's snapshot
+
+
+def observe(metric, labels, seconds):
+    """Record one observation; labels is a tuple of (name, value) pairs"""
+    index = bisect.bisect_left(BUCKETS, seconds)
+    key = (metric, labels)
+    with _lock:
+        counts = _series.get(key)
+        if counts is None:
+            counts = _series[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        counts[index] += 1
+        counts[-1] += seconds
+
+
+class span:
+    """Time a block of code as one phase: `with span("encode"): ...`"""
+
+    __slots__ = ("labels", "start")
+
+    def __init__(self, phase):
+        self.labels = (("phase", phase),)
+
+    def __enter__(self):
+        self.start = _perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(PHASE_METRIC, self.labels, _perf_counter() - self.start)
+        return False
+
+
+def _before_request():
+    g._metrics_start = _perf_counter()
+
+
+def observe_request(url_rule, method, status, start):
+    """Record a request that started at start (a perf_counter value).
+    Also called from async_app.py, which has its own hooks."""
+    route = url_rule.rule if url_rule else "<unmatched>"
+    observe(REQUEST_METRIC, (("route", route), ("method", method), ("status", str(status))),
+            _perf_counter() - start)
+    if _multiproc_dir and _perf_counter() - _last_flush >= _flush_interval:
+        flush()
+
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        observe_request(request.url_rule, request.method, response.status_code, start)
+    return response
+
+
+def _snapshot():
+    with _lock:
+        return [[metric, list(labels), list(counts)] for (metric, labels), counts in _series.items()]
+
+
+def _snapshot_name():
+    global _snapshot_file
+    pid, name = _snapshot_file
+    if pid != os.getpid():  # first flush in this process (or a forked child)
+        pid = os.getpid()
+        name = f"metrics_{pid}_{time.time_ns()}.json"
+        _snapshot_file = (pid, name)
+    return name
+
+
+def remove_worker_files(pid):
+    """Delete the snapshots of a worker that has exited (gunicorn's child_exit)"""
+    if not _multiproc_dir or not os.path.isdir(_multiproc_dir):
+        return
+    prefix = f"metrics_{pid}_"
+    for name in os.listdir(_multiproc_dir):
+        if name.startswith(prefix):
+            try:
+                os.remove(os.path.join(_multiproc_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+def flush():
+    """Write this worker's counters to the multiprocess directory"""
+    global _last_flush
+    _last_flush = _perf_counter()
+    if not _multiproc_dir:
+        return
+    os.makedirs(_multiproc_dir, exist_ok=True)
+    path = os.path.join(_multiproc_dir, _snapshot_name())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _collect():
+    """Counters of every worker (or just this one), summed per series"""
+    if not _multiproc_dir:
+        with _lock:
+            return {key: list(counts) for key, counts in _series.items()}
+
+    flush()
+    merged = {}
+    for name in os.listdir(_multiproc_dir):
+        if not (name.startswith("metrics_") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(_multiproc_dir, name)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue  # a worker is replacing its file right now
+        for metric, labels, counts in entries:
+            key = (metric, tuple(tuple(pair) for pair in labels))
+            total = merged.get(key)
+            if total is None:
+                merged[key] = counts
+            else:
+                merged[key] = [a + b for a, b in zip(total, counts)]
+    return merged
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    escaped = ('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_metrics():
+    """Prometheus text exposition (format 0.0.4) of all histograms"""
+    series = _collect()
+    by_metric = {}
+    for (metric, labels), counts in sorted(series.items()):
+        by_metric.setdefault(metric, []).append((labels, counts))
+
+    lines = []
+    for metric, entries in by_metric.items():
+        lines.append(f"# HELP {metric} {HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, counts in entries:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+            cumulative += counts[len(BUCKETS)]
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {counts[-1]}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def init_app(app):
+    """Time every request and serve /metrics"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", lambda: (
+        render_metrics(), 200, {"Content-Type": CONTENT_TYPE}))
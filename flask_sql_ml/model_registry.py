@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import threading
+import datetime
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# Registry layout:
+#   model_registry/<name>/<version>/<artifact>      pickled estimator
+#   model_registry/<name>/<version>/manifest.json   checksum, features, metrics
+# A version directory only becomes visible once its manifest is in place, so
+# the watcher never picks up a half-copied artifact.
+base_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REGISTRY_DIR = os.path.join(base_dir, "model_registry")
+DEFAULT_FEATURES = ['o3', 'pm25', 'pm10', 'no2', 'so2', 'co']
+MANIFEST_NAME = "manifest.json"
+VERSION_PATTERN = re.compile(r"v(\d+)")
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the hex sha256 digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """Changes whenever the file is replaced or rewritten"""
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def list_versions(registry_dir, name):
+    """Return the published version names (vNNNN) for a model, oldest first.
+
+    Anything else in the model directory (staging dirs, notes, backups) is
+    ignored.
+    """
+    model_dir = os.path.join(registry_dir, name)
+    if not os.path.isdir(model_dir):
+        return []
+    versions = [
+        entry.name for entry in os.scandir(model_dir)
+        if entry.is_dir() and VERSION_PATTERN.fullmatch(entry.name)
+        and os.path.exists(os.path.join(entry.path, MANIFEST_NAME))
+    ]
+    return sorted(versions, key=lambda v: int(VERSION_PATTERN.fullmatch(v).group(1)))
+
+
+def publish(artifact_path, registry_dir=DEFAULT_REGISTRY_DIR, name="rf",
+            features=None, metrics=None, smoke_input=None):
+    """Copy a trained artifact into the registry as a new version.
+
+    The version is staged in a hidden directory and renamed into place in one
+    step, so running workers see either nothing or the complete version.
+    """
+    features = features or DEFAULT_FEATURES
+    model_dir = os.path.join(registry_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+
+    existing = list_versions(registry_dir, name)
+    next_number = int(VERSION_PATTERN.fullmatch(existing[-1]).group(1)) + 1 if existing else 1
+    version = f"v{next_number:04d}"
+
+    artifact_name = os.path.basename(artifact_path)
+    staging_dir = os.path.join(model_dir, f".staging-{version}-{os.getpid()}")
+    os.makedirs(staging_dir)
+    try:
+        staged_artifact = os.path.join(staging_dir, artifact_name)
+        shutil.copyfile(artifact_path, staged_artifact)
+        manifest = {
+            "version": version,
+            "artifact": artifact_name,
+            "sha256": file_sha256(staged_artifact),
+            "features": list(features),
+            "smoke_input": smoke_input,
+            "metrics": metrics or {},
+            "created": datetime.datetime.utcnow().isoformat(),
+        }
+        with open(os.path.join(staging_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging_dir, os.path.join(model_dir, version))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return version
+
+
+def tree_predictions(model, X):
+    """Per-tree predictions of a fitted forest, shape (n_trees, n_rows)"""
+    X = np.asarray(X, dtype=np.float32)  # what the trees compare against, so no copy per tree
+    return np.stack([np.asarray(tree.predict(X), dtype=float).reshape(len(X))
+                     for tree in model.estimators_])
+
+
+def is_forest(model):
+    estimators = getattr(model, "estimators_", None)
+    return isinstance(estimators, list) and bool(estimators) and \
+        all(hasattr(t, "predict") for t in estimators)
+
+
+class LoadedModel:
+    """An immutable, validated model version as served to requests"""
+
+    def __init__(self, version, model, features, manifest, timings, loaded_at):
+        self.version = version
+        self.model = model
+        self.features = features
+        self.manifest = manifest
+        self.timings = timings
+        self.loaded_at = loaded_at
+
+    def predict(self, rows):
+        with span("model_predict"):
+            if not hasattr(self.model, "feature_names_in_"):
+                # Fitted on a plain feature buffer (train_model.py)
+                return self.model.predict(np.asarray(rows, dtype=np.float32))
+            frame = pd.DataFrame(rows, columns=self.features)
+            return self.model.predict(frame)
+
+    def predict_trees(self, rows):
+        """Each tree's predictions, shape (n_trees, n_rows), for a forest"""
+        with span("model_predict"):
+            return tree_predictions(self.model, rows)
+
+
+class ModelRegistry:
+    """Watches a registry directory and hot-swaps the live model.
+
+    Requests call current() once and keep that reference for the rest of the
+    request; the watcher replaces the reference with a single assignment, so
+    a swap never affects predictions that are already in flight.
+
+    The first current() in a process starts the watcher, so importing the app
+    (gunicorn --preload, `flask db`, benchmarks) starts no threads, and every
+    forked worker gets its own watcher. The watcher does the initial load
+    too; current() waits for it at most initial_wait seconds and otherwise
+    returns None, so a slow load never runs on a request thread. With
+    poll_interval <= 0 there is no watcher and the first current() loads the
+    model itself.
+    """
+
+    def __init__(self, registry_dir=DEFAULT_REGISTRY_DIR, name="rf",
+                 legacy_path=None, poll_interval=30.0, initial_wait=10.0):
+        self.registry_dir = registry_dir
+        self.name = name
+        self.legacy_path = legacy_path
+        self.poll_interval = poll_interval
+        self.initial_wait = initial_wait
+        self._active = None
+        self._load_lock = threading.Lock()
+        self._failed = {}
+        self._legacy_failed = None  # signature of the legacy file that failed to load
+        self._ready = threading.Event()
+        self._last_error = None
+        self._last_check = None
+        self._watcher = None
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def current(self):
+        if self._started_pid != os.getpid():
+            self.start()
+        if not self._ready.is_set():
+            self._ready.wait(self.initial_wait)
+        return self._active
+
+    def _load_version(self, version):
+        """Read, verify, unpickle and smoke-test one version without touching
+        the live reference."""
+        version_dir = os.path.join(self.registry_dir, self.name, version)
+        with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        artifact_path = os.path.join(version_dir, manifest["artifact"])
+
+        timings = {}
+        start = time.perf_counter()
+        with open(artifact_path, "rb") as f:
+            payload = f.read()
+        timings["read_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        checksum = hashlib.sha256(payload).hexdigest()
+        timings["verify_ms"] = (time.perf_counter() - start) * 1000
+        if checksum != manifest["sha256"]:
+            raise ValueError(f"checksum mismatch for {version}: expected "
+                             f"{manifest['sha256']}, got {checksum}")
+
+        start = time.perf_counter()
+        model = pickle.loads(payload)
+        timings["unpickle_ms"] = (time.perf_counter() - start) * 1000
+
+        features = manifest.get("features") or DEFAULT_FEATURES
+        loaded = LoadedModel(version, model, features, manifest, timings,
+                             datetime.datetime.utcnow().isoformat())
+        self._smoke_test(loaded)
+        return loaded
+
+    def _load_legacy(self):
+        """Load the unversioned rf_model.pkl used before the registry existed"""
+        timings = {}
+        start = time.perf_counter()
+        with open(self.legacy_path, "rb") as f:
+            model = pickle.load(f)
+        timings["unpickle_ms"] = (time.perf_counter() - start) * 1000
+        manifest = {"artifact": os.path.basename(self.legacy_path)}
+        loaded = LoadedModel("legacy", model, DEFAULT_FEATURES, manifest,
+                             timings, datetime.datetime.utcnow().isoformat())
+        self._smoke_test(loaded)
+        return loaded
+
+    def _smoke_test(self, loaded):
+        start = time.perf_counter()
+        smoke_input = loaded.manifest.get("smoke_input") or [1.0] * len(loaded.features)
+        prediction = np.asarray(loaded.predict([smoke_input]), dtype=float)
+        loaded.timings["smoke_ms"] = (time.perf_counter() - start) * 1000
+        if prediction.shape[0] != 1 or not np.all(np.isfinite(prediction)):
+            raise ValueError(f"smoke prediction for {loaded.version} returned {prediction!r}")
+
+    def refresh(self):
+        """Swap to the newest valid version if it differs from the live one.
+
+        Returns True if the live model changed.
+        """
+        with self._load_lock:
+            self._last_check = datetime.datetime.utcnow().isoformat()
+            candidates = [v for v in list_versions(self.registry_dir, self.name)
+                          if v not in self._failed]
+            active = self._active
+            if candidates:
+                newest = candidates[-1]
+                if active is not None and active.version == newest:
+                    return False
+                loader = lambda: self._load_version(newest)
+                label = newest
+            elif active is None and self.legacy_path and os.path.exists(self.legacy_path):
+                signature = file_signature(self.legacy_path)
+                if signature == self._legacy_failed:
+                    return False  # same file as last time; wait until it is replaced
+                loader = self._load_legacy
+                label = "legacy"
+            else:
+                return False
+
+            start = time.perf_counter()
+            try:
+                loaded = loader()
+            except Exception as e:
+                if label == "legacy":
+                    self._legacy_failed = signature
+                self._failed[label] = str(e)
+                self._last_error = f"{label}: {e}"
+                print(f"Error loading model {self.name} {label}: {e}")
+                traceback.print_exc()
+                return False
+            loaded.timings["total_ms"] = (time.perf_counter() - start) * 1000
+
+            self._active = loaded
+            print(f"Model {self.name} {label} is now live "
+                  f"(loaded in {loaded.timings['total_ms']:.1f} ms)")
+            return True
+
+    def _refresh_logged(self):
+        try:
+            self.refresh()
+        except Exception:
+            traceback.print_exc()
+
+    def _watch(self):
+        self._refresh_logged()  # the initial load
+        self._ready.set()
+        while not self._stop.wait(self.poll_interval):
+            self._refresh_logged()
+
+    def start(self):
+        """Start the background watcher, which loads the current version,
+        once per process"""
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return self
+            if self.poll_interval > 0:
+                # A watcher inherited through fork is not running in this
+                # process, and neither is a load it had in progress
+                if self._active is None:
+                    self._ready.clear()
+                self._watcher = threading.Thread(target=self._watch,
+                                                 name=f"model-watcher-{self.name}",
+                                                 daemon=True)
+                self._watcher.start()
+            else:
+                self._refresh_logged()
+                self._ready.set()
+            self._started_pid = os.getpid()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        active = self.current()
+        return {
+            "model": self.name,
+            "active_version": active.version if active else None,
+            "loaded_at": active.loaded_at if active else None,
+            "load_timings_ms": active.timings if active else None,
+            "metrics": active.manifest.get("metrics") if active else None,
+            "available_versions": list_versions(self.registry_dir, self.name),
+            "failed_versions": dict(self._failed),
+            "last_error": self._last_error,
+            "last_check": self._last_check,
+            "poll_interval": self.poll_interval,
+            "pid": os.getpid(),
+        }
@@ -0,0 +1,298 @@
+"""AQI data for many cities and stations, partitioned by city/station/year.
+
+    datasets/
+      catalog.json
+      city=delhi/station=all/year=2024.parquet
+      city=delhi/station=all/year=2025.parquet
+      ...
+
+    python partitioned_store.py import Final_Dataset.csv --city delhi [--station all]
+    python partitioned_store.py list
+
+catalog.json lists every partition with its row count, size and date range,
+so a worker knows what exists without opening any data file. Partitions are
+read on first access and kept in an LRU bounded by DATASET_CACHE_BYTES of
+DataFrame memory; the per-month aggregates the charts need are kept
+separately (a few numbers per partition), so a chart request can be served
+again after its partitions were evicted. Memory per worker follows the cities
+in use, not the size of the catalog.
+
+Partitions are Parquet when pyarrow is installed, otherwise CSV; the catalog
+records the format of each file. A city can also be registered with an
+in-process dataset (the app's default city and its DatasetStore), which is
+then served under that name in place of any partitions.
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import POLLUTANT_COLUMNS
+
+try:
+    import pyarrow  # noqa: F401  (pandas' Parquet engine)
+    DEFAULT_FORMAT = "parquet"
+except ImportError:  # optional; partitions are written as CSV
+    DEFAULT_FORMAT = "csv"
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+DATASET_ROOT = os.getenv("DATASET_ROOT", os.path.join(base_dir, "datasets"))
+CACHE_BYTES = int(os.getenv("DATASET_CACHE_BYTES", str(256 * 1024 * 1024)))
+COLUMNS = ["Date", "year", "month"] + POLLUTANT_COLUMNS + ["AQI"]
+DEFAULT_STATION = "all"
+
+
+class UnknownCity(KeyError):
+    pass
+
+
+def partition_path(city, station, year, fmt):
+    return os.path.join(f"city={city}", f"station={station}", f"year={year}.{fmt}")
+
+
+def normalize_name(name):
+    """Catalog names are lower case with spaces as dashes: 'New Delhi' -> 'new-delhi'"""
+    name = str(name).strip().lower().replace(" ", "-")
+    if not name or "/" in name or "\\" in name or name.startswith("."):
+        raise ValueError(f"Invalid city or station name: {name!r}")
+    return name
+
+
+def signature(entry):
+    """Changes whenever a partition file is rewritten"""
+    return (entry["path"], entry["bytes"], entry["rows"], entry["max_date"])
+
+
+def read_catalog(root):
+    try:
+        with open(os.path.join(root, "catalog.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"partitions": []}
+
+
+def write_catalog(root, catalog):
+    path = os.path.join(root, "catalog.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(catalog, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def import_frame(df, root, city, station=DEFAULT_STATION, fmt=DEFAULT_FORMAT):
+    """Write one city/station's readings as per-year partitions and register
+    them in the catalog, replacing partitions of the same years"""
+    city, station = normalize_name(city), normalize_name(station)
+    df = df[COLUMNS].sort_values("Date", kind="stable")
+    catalog = read_catalog(root)
+    entries = {(p["city"], p["station"], p["year"]): p for p in catalog["partitions"]}
+    for year, part in df.groupby("year"):
+        relative = partition_path(city, station, int(year), fmt)
+        path = os.path.join(root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if fmt == "parquet":
+            part.to_parquet(tmp_path, index=False)
+        else:
+            part.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        entries[(city, station, int(year))] = {
+            "city": city, "station": station, "year": int(year), "path": relative,
+            "format": fmt, "rows": len(part), "bytes": os.path.getsize(path),
+            "min_date": part["Date"].iloc[0], "max_date": part["Date"].iloc[-1],
+        }
+    catalog["partitions"] = sorted(entries.values(), key=lambda p: (p["city"], p["station"], p["year"]))
+    write_catalog(root, catalog)
+    return catalog
+
+
+class CityView:
+    """One city's data with the read interface of DatasetStore, so charts and
+    routes can use either"""
+
+    def __init__(self, store, city):
+        self.store = store
+        self.city = city
+        self.pollutant_columns = list(POLLUTANT_COLUMNS)
+
+    @property
+    def empty(self):
+        return not self.store.partitions(self.city)
+
+    def _monthly(self, month):
+        """[(year, count, aqi_sum, pollutant_sums)] for one month"""
+        rows = []
+        for entry in self.store.partitions(self.city):
+            aggregates = self.store.aggregates(entry).get(month)
+            if aggregates is not None:
+                rows.append((entry["year"],) + aggregates)
+        return rows
+
+    def yearly_means(self, month):
+        totals = {}
+        for year, count, aqi_sum, _ in self._monthly(month):
+            c, s = totals.get(year, (0, 0.0))
+            totals[year] = (c + count, s + aqi_sum)
+        years = sorted(totals)
+        return pd.Series([totals[y][1] / totals[y][0] for y in years],
+                         index=pd.Index(years, name="year"), name="AQI", dtype=float)
+
+    def pollutant_totals(self, month):
+        sums = np.zeros(len(self.pollutant_columns))
+        for _, _, _, pollutant_sums in self._monthly(month):
+            sums += pollutant_sums
+        return pd.Series(sums, index=self.pollutant_columns)
+
+    def frame(self, years=None):
+        return self.store.frame(self.city, years=years)
+
+    def describe(self):
+        """Columns and row count from the catalog, without reading partitions"""
+        return {"columns": list(COLUMNS),
+                "rows": sum(entry["rows"] for entry in self.store.partitions(self.city))}
+
+
+class PartitionedStore:
+    def __init__(self, root=DATASET_ROOT, max_bytes=CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.cache_bytes = 0
+        self.loads = 0
+        self._catalog = {"partitions": []}
+        self._catalog_mtime = None
+        self._by_city = {}
+        self._frames = OrderedDict()  # signature -> (DataFrame, bytes)
+        self._aggregates = {}  # signature -> {month: (count, aqi_sum, pollutant_sums)}
+        self._registered = {}  # city -> dataset served in place of partitions
+        self._lock = threading.RLock()
+
+    def register(self, city, dataset):
+        """Serve dataset (anything with CityView's read interface) as city"""
+        self._registered[normalize_name(city)] = dataset
+
+    def _refresh_catalog(self):
+        try:
+            mtime = os.path.getmtime(os.path.join(self.root, "catalog.json"))
+        except OSError:
+            mtime = None
+        if mtime == self._catalog_mtime:
+            return
+        catalog = read_catalog(self.root)
+        by_city = {}
+        for entry in catalog["partitions"]:
+            by_city.setdefault(entry["city"], []).append(entry)
+        current = {signature(e) for e in catalog["partitions"]}
+        with self._lock:
+            self._catalog, self._by_city, self._catalog_mtime = catalog, by_city, mtime
+            # Drop what belongs to partitions that were replaced or removed
+            for key in [k for k in self._frames if k not in current]:
+                self.cache_bytes -= self._frames.pop(key)[1]
+            for key in [k for k in self._aggregates if k not in current]:
+                del self._aggregates[key]
+
+    def cities(self):
+        self._refresh_catalog()
+        return sorted(set(self._by_city) | set(self._registered))
+
+    def partitions(self, city, station=None, years=None):
+        self._refresh_catalog()
+        entries = self._by_city.get(city)
+        if entries is None:
+            raise UnknownCity(city)
+        return [e for e in entries
+                if (station is None or e["station"] == station) and (years is None or e["year"] in years)]
+
+    def view(self, city):
+        try:
+            city = normalize_name(city)
+        except ValueError:
+            raise UnknownCity(city)
+        if city in self._registered:
+            return self._registered[city]
+        self.partitions(city)  # raises UnknownCity
+        return CityView(self, city)
+
+    def load(self, entry):
+        """One partition as a DataFrame, from the LRU or from disk"""
+        key = signature(entry)
+        path = os.path.join(self.root, entry["path"])
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None:
+                self._frames.move_to_end(key)
+                return cached[0]
+        if entry["format"] == "parquet":
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_csv(path)
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self.loads += 1
+            if nbytes <= self.max_bytes and key not in self._frames:
+                self._frames[key] = (df, nbytes)
+                self.cache_bytes += nbytes
+                while self.cache_bytes > self.max_bytes:
+                    _, (_, evicted) = self._frames.popitem(last=False)
+                    self.cache_bytes -= evicted
+        return df
+
+    def aggregates(self, entry):
+        """Per-month count, AQI sum and pollutant sums of one partition"""
+        key = signature(entry)
+        cached = self._aggregates.get(key)
+        if cached is not None:
+            return cached
+        df = self.load(entry)
+        grouped = df.groupby("month")
+        counts = grouped["AQI"].count()
+        aqi_sums = grouped["AQI"].sum()
+        pollutant_sums = grouped[POLLUTANT_COLUMNS].sum()
+        by_month = {int(month): (int(counts[month]), float(aqi_sums[month]),
+                                 pollutant_sums.loc[month].to_numpy(dtype=float))
+                    for month in counts.index}
+        self._aggregates[key] = by_month
+        return by_month
+
+    def frame(self, city, station=None, years=None):
+        entries = self.partitions(city, station, years)
+        if not entries:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat([self.load(e) for e in entries], ignore_index=True)
+
+    def status(self):
+        with self._lock:
+            return {"cities": len(set(self._by_city) | set(self._registered)), "partitions": len(self._catalog["partitions"]),
+                    "cached_partitions": len(self._frames), "cached_bytes": self.cache_bytes,
+                    "max_bytes": self.max_bytes, "loads": self.loads}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the partitioned multi-city AQI dataset")
+    parser.add_argument("--root", default=DATASET_ROOT)
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="partition a CSV of one city/station by year")
+    importer.add_argument("csv")
+    importer.add_argument("--city", required=True)
+    importer.add_argument("--station", default=DEFAULT_STATION)
+    importer.add_argument("--format", choices=("parquet", "csv"), default=DEFAULT_FORMAT)
+    commands.add_parser("list", help="show the catalog")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        df = pd.read_csv(args.csv)
+        catalog = import_frame(df, args.root, args.city, args.station, args.format)
+        print(f"Imported {len(df)} rows into {args.root} ({len(catalog['partitions'])} partitions)")
+    else:
+        for p in read_catalog(args.root)["partitions"]:
+            print(f"{p['city']:20} {p['station']:15} {p['year']} {p['rows']:8d} rows "
+                  f"{p['bytes']:10d} B  {p['min_date']}..{p['max_date']}  {p['path']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
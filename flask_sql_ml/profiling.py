@@ -0,0 +1,343 @@
+"""On-demand request profiling and allocation tracing for live workers.
+
+Everything is off unless PROFILING_ADMIN_TOKEN is set; without it no hooks,
+threads or routes are installed at all. With it, an admin turns profiling on
+for every worker through a shared config file:
+
+    POST /admin/profiling        {"enabled": true, "sample_rate": 0.05,
+                                  "mode": "stack" | "cprofile",
+                                  "interval_ms": 5, "tracemalloc": false}
+    GET  /admin/profiling        current config and per-worker result files
+    GET  /admin/profiling/<pid>/stacks      collapsed stacks (flamegraph.pl input)
+    GET  /admin/profiling/<pid>/cprofile    merged pstats dump
+    GET  /admin/profiling/<pid>/tracemalloc allocation growth since tracing started
+
+Requests send the token in the X-Admin-Token header. While profiling is
+disabled, the per-request cost is a pid check and a boolean check. The
+background thread starts with a worker's first request, not at import, so
+gunicorn --preload forks no half-started thread and every worker gets its own.
+
+Only one cProfile profiler can run in a process at a time (Python 3.12 moved
+it onto sys.monitoring), so cprofile mode profiles one sampled request at a
+time; a request sampled while another is being profiled is skipped.
+"""
+import os
+import sys
+import json
+import time
+import random
+import marshal
+import cProfile
+import pstats
+import tempfile
+import threading
+import tracemalloc
+
+from flask import Blueprint, g, jsonify, request, send_file
+
+import admin_auth
+
+ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN")
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "aqi-profiling"))
+CONFIG_PATH = os.path.join(PROFILING_DIR, "config.json")
+CONFIG_POLL_SECONDS = 2.0
+RESULT_FLUSH_SECONDS = 2.0
+SNAPSHOT_SECONDS = 30.0
+MODES = ("stack", "cprofile")
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "sample_rate": 0.05,
+    "mode": "stack",
+    "interval_ms": 5,
+    "tracemalloc": False,
+    "generation": 0,
+}
+
+bp = Blueprint("profiling", __name__, url_prefix="/admin/profiling")
+
+_active = False
+_config = dict(DEFAULT_CONFIG)
+_config_mtime = None
+_lock = threading.Lock()
+_cprofile_lock = threading.Lock()  # held for the duration of a profiled request
+_background_pid = None
+_background_lock = threading.Lock()
+_stack_counts = {}
+_sampled_threads = set()
+_cprofile_stats = None
+_last_flush = 0.0
+_tracemalloc_baseline = None
+_last_snapshot = 0.0
+
+
+def _result_path(kind, pid):
+    extension = {"stacks": "txt", "cprofile": "prof", "tracemalloc": "txt"}[kind]
+    return os.path.join(PROFILING_DIR, f"{kind}_{pid}.{extension}")
+
+
+def _read_config():
+    global _config, _config_mtime, _active
+    try:
+        mtime = os.path.getmtime(CONFIG_PATH)
+    except OSError:
+        return
+    if mtime == _config_mtime:
+        return
+    try:
+        with open(CONFIG_PATH) as f:
+            config = dict(DEFAULT_CONFIG, **json.load(f))
+    except (OSError, ValueError):
+        return
+    _config_mtime = mtime
+    if config["generation"] != _config["generation"]:
+        _reset_results()
+    _config = config
+    _active = bool(config["enabled"]) and config["sample_rate"] > 0
+
+
+def _reset_results():
+    global _cprofile_stats
+    with _lock:
+        _stack_counts.clear()
+        _cprofile_stats = None
+
+
+# ----------------------------------------------------------------- sampling
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _sample_stacks():
+    frames = sys._current_frames()
+    with _lock:
+        for ident in list(_sampled_threads):
+            frame = frames.get(ident)
+            if frame is not None:
+                stack = _collapse(frame)
+                _stack_counts[stack] = _stack_counts.get(stack, 0) + 1
+
+
+def _background():
+    """Poll the shared config, drive the stack sampler and tracemalloc"""
+    next_poll = 0.0
+    while True:
+        now = time.monotonic()
+        if now >= next_poll:
+            _read_config()
+            _update_tracemalloc(now)
+            next_poll = now + CONFIG_POLL_SECONDS
+        if _active and _config["mode"] == "stack" and _sampled_threads:
+            _sample_stacks()
+            time.sleep(max(_config["interval_ms"], 1) / 1000.0)
+        else:
+            time.sleep(0.05 if _active else CONFIG_POLL_SECONDS)
+
+
+def _update_tracemalloc(now):
+    global _tracemalloc_baseline, _last_snapshot
+    wanted = bool(_config["tracemalloc"])
+    if wanted and not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+        _tracemalloc_baseline = _take_snapshot()
+        _last_snapshot = now
+    elif not wanted and tracemalloc.is_tracing():
+        _write_tracemalloc_diff()
+        tracemalloc.stop()
+        _tracemalloc_baseline = None
+    elif wanted and now - _last_snapshot >= SNAPSHOT_SECONDS:
+        _write_tracemalloc_diff()
+        _last_snapshot = now
+
+
+def _take_snapshot():
+    # Leave out what the profiler itself holds, e.g. the baseline snapshot
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, __file__, all_frames=True),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+
+def _write_tracemalloc_diff(limit=50):
+    if _tracemalloc_baseline is None or not tracemalloc.is_tracing():
+        return
+    snapshot = _take_snapshot()
+    lines = [f"# pid {os.getpid()}, growth since tracing started, top {limit} by size",
+             f"# traced now {tracemalloc.get_traced_memory()[0]} B, "
+             f"peak {tracemalloc.get_traced_memory()[1]} B"]
+    for stat in snapshot.compare_to(_tracemalloc_baseline, "traceback")[:limit]:
+        lines.append(f"{stat.size_diff:+d} B ({stat.count_diff:+d} blocks), now {stat.size} B")
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+    _atomic_write(_result_path("tracemalloc", os.getpid()), "\n".join(lines) + "\n")
+
+
+def _atomic_write(path, data):
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _flush_results():
+    global _last_flush
+    _last_flush = time.monotonic()
+    pid = os.getpid()
+    with _lock:
+        stacks = "".join(f"{stack} {count}\n" for stack, count in sorted(_stack_counts.items()))
+        stats = _cprofile_stats
+        if stats is not None:
+            # pstats.Stats.dump_stats() format, written without re-reading
+            profile_dump = marshal.dumps(stats.stats)
+    if stacks:
+        _atomic_write(_result_path("stacks", pid), stacks)
+    if stats is not None:
+        _atomic_write(_result_path("cprofile", pid), profile_dump)
+
+
+# ------------------------------------------------------------ request hooks
+
+def _start_background():
+    """Start the config poller and stack sampler, once per process"""
+    global _background_pid
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        threading.Thread(target=_background, name="profiling", daemon=True).start()
+        _background_pid = os.getpid()
+
+
+def _before_request():
+    if _background_pid != os.getpid():
+        _start_background()
+    if not _active or random.random() >= _config["sample_rate"]:
+        return
+    if _config["mode"] == "cprofile":
+        if not _cprofile_lock.acquire(blocking=False):
+            return  # another request in this worker is being profiled
+        profiler = cProfile.Profile()
+        g._profiler = profiler
+        try:
+            profiler.enable()
+        except Exception:
+            del g._profiler
+            _cprofile_lock.release()
+            raise
+    else:
+        ident = threading.get_ident()
+        g._sampled_thread = ident
+        with _lock:
+            _sampled_threads.add(ident)
+
+
+def _teardown_request(exc):
+    global _cprofile_stats
+    if not _active and "_profiler" not in g and "_sampled_thread" not in g:
+        return
+    profiler = g.pop("_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        _cprofile_lock.release()
+        with _lock:
+            if _cprofile_stats is None:
+                _cprofile_stats = pstats.Stats(profiler)
+            else:
+                _cprofile_stats.add(profiler)
+    ident = g.pop("_sampled_thread", None)
+    if ident is not None:
+        with _lock:
+            _sampled_threads.discard(ident)
+    if time.monotonic() - _last_flush >= RESULT_FLUSH_SECONDS:
+        _flush_results()
+
+
+# ------------------------------------------------------------------- routes
+
+@bp.before_request
+def _require_admin():
+    return admin_auth.token_error(ADMIN_TOKEN)
+
+
+def _workers():
+    workers = {}
+    if os.path.isdir(PROFILING_DIR):
+        for name in os.listdir(PROFILING_DIR):
+            kind, _, rest = name.partition("_")
+            pid = rest.split(".")[0]
+            if kind in ("stacks", "cprofile", "tracemalloc") and pid.isdigit() and not name.endswith(".tmp"):
+                workers.setdefault(pid, []).append(kind)
+    return workers
+
+
+@bp.route("", methods=["GET"])
+def profiling_status():
+    _read_config()
+    return jsonify({"config": _config, "pid": os.getpid(), "workers": _workers()})
+
+
+@bp.route("", methods=["POST"])
+def configure_profiling():
+    data = request.get_json() or {}
+    config = dict(_config)
+    for key in ("enabled", "tracemalloc"):
+        if key in data:
+            config[key] = bool(data[key])
+    try:
+        if "sample_rate" in data:
+            config["sample_rate"] = float(data["sample_rate"])
+        if "interval_ms" in data:
+            config["interval_ms"] = int(data["interval_ms"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "sample_rate and interval_ms must be numbers"}), 400
+    if not 0 <= config["sample_rate"] <= 1:
+        return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+    if "mode" in data:
+        if data["mode"] not in MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(MODES)}"}), 400
+        config["mode"] = data["mode"]
+    if data.get("reset"):
+        config["generation"] += 1
+        for pid in _workers():
+            for kind in ("stacks", "cprofile", "tracemalloc"):
+                try:
+                    os.remove(_result_path(kind, pid))
+                except OSError:
+                    pass
+
+    _atomic_write(CONFIG_PATH, json.dumps(config))
+    _read_config()
+    return jsonify({"config": _config, "pid": os.getpid()})
+
+
+@bp.route("/<int:pid>/<kind>", methods=["GET"])
+def download_results(pid, kind):
+    if kind not in ("stacks", "cprofile", "tracemalloc"):
+        return jsonify({"error": "kind must be stacks, cprofile or tracemalloc"}), 404
+    if pid == os.getpid():
+        if kind == "tracemalloc":
+            _write_tracemalloc_diff()
+        else:
+            _flush_results()
+    path = _result_path(kind, pid)
+    if not os.path.exists(path):
+        return jsonify({"error": f"No {kind} results for worker {pid}"}), 404
+    mimetype = "application/octet-stream" if kind == "cprofile" else "text/plain"
+    return send_file(path, mimetype=mimetype, as_attachment=True,
+                     download_name=os.path.basename(path))
+
+
+def init_app(app):
+    """Install profiling hooks and admin routes if an admin token is configured"""
+    if not ADMIN_TOKEN:
+        return
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(bp)
+    _read_config()
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ("daily", "weekly", "monthly")
+# Means come from differences of running sums, which carry float error in the
+# last few digits; outputs are rounded so equal ranges print equal values
+DECIMALS = 6
+
+
+class RangeAggregates:
+    """Constant-time AQI aggregates over any date range of the dataset.
+
+    Rows are sorted by Date once; prefix sums give the mean of any row range
+    with two lookups, and a sparse table of AQI minima/maxima (level j holds
+    the min/max of every run of 2**j rows) answers range min/max with two
+    overlapping lookups. Query cost therefore does not grow with the length
+    of the range, only with the number of buckets returned.
+
+    Instances are not modified after construction; extended() returns a new
+    index with rows appended, so queries running on the old one are safe.
+    """
+
+    def __init__(self, frame, pollutant_columns):
+        self.pollutant_columns = list(pollutant_columns)
+        ordered = frame.sort_values("Date", kind="stable")
+        dates, values = self._columns(ordered)
+        self.dates = dates
+        self.prefix = np.zeros((len(values) + 1, values.shape[1]))
+        np.cumsum(values, axis=0, out=self.prefix[1:])
+        self._min_table = [values[:, 0]]
+        self._max_table = [values[:, 0]]
+        self._grow_tables()
+
+    def _columns(self, frame):
+        dates = pd.to_datetime(frame["Date"]).to_numpy().astype("datetime64[D]")
+        values = frame[["AQI"] + self.pollutant_columns].to_numpy(dtype=np.float64)
+        return dates, values
+
+    def _grow_tables(self):
+        """Fill in sparse table entries for rows added to level 0"""
+        n = len(self._min_table[0])
+        level, width = 1, 1
+        while 2 * width <= n:
+            previous_min, previous_max = self._min_table[level - 1], self._max_table[level - 1]
+            done = len(self._min_table[level]) if level < len(self._min_table) else 0
+            stop = n - 2 * width + 1
+            new_min = np.minimum(previous_min[done:stop], previous_min[done + width:stop + width])
+            new_max = np.maximum(previous_max[done:stop], previous_max[done + width:stop + width])
+            if level < len(self._min_table):
+                self._min_table[level] = np.concatenate([self._min_table[level], new_min])
+                self._max_table[level] = np.concatenate([self._max_table[level], new_max])
+            else:
+                self._min_table.append(new_min)
+                self._max_table.append(new_max)
+            level, width = level + 1, width * 2
+
+    def extended(self, frame):
+        """A new index with frame's rows appended, or None if any of them is
+        dated before the last indexed row (then the index must be rebuilt)"""
+        ordered = frame.sort_values("Date", kind="stable")
+        dates, values = self._columns(ordered)
+        if len(self.dates) and len(dates) and dates[0] < self.dates[-1]:
+            return None
+        index = object.__new__(RangeAggregates)
+        index.pollutant_columns = self.pollutant_columns
+        index.dates = np.concatenate([self.dates, dates])
+        index.prefix = np.concatenate([self.prefix, self.prefix[-1] + np.cumsum(values, axis=0)])
+        index._min_table = list(self._min_table)
+        index._max_table = list(self._max_table)
+        index._min_table[0] = np.concatenate([self._min_table[0], values[:, 0]])
+        index._max_table[0] = np.concatenate([self._max_table[0], values[:, 0]])
+        index._grow_tables()
+        return index
+
+    def __len__(self):
+        return len(self.dates)
+
+    def _range_extremes(self, lo, hi):
+        """Vectorised min/max of AQI over row ranges [lo, hi), all non-empty"""
+        level = np.floor(np.log2(hi - lo)).astype(int)
+        width = 1 << level
+        mins = np.empty(len(lo))
+        maxs = np.empty(len(lo))
+        for j in np.unique(level):
+            sel = level == j
+            left, right = lo[sel], hi[sel] - width[sel]
+            mins[sel] = np.minimum(self._min_table[j][left], self._min_table[j][right])
+            maxs[sel] = np.maximum(self._max_table[j][left], self._max_table[j][right])
+        return mins, maxs
+
+    def bucket_edges(self, start, end, resolution):
+        """Bucket start dates covering [start, end], plus the exclusive end"""
+        start = np.datetime64(start, "D")
+        end = np.datetime64(end, "D") + np.timedelta64(1, "D")
+        if resolution == "daily":
+            return np.arange(start, end + np.timedelta64(1, "D"), dtype="datetime64[D]")
+        if resolution == "weekly":
+            # numpy day 0 (1970-01-01) is a Thursday; weeks start on Monday
+            monday = start - np.timedelta64((start.astype(np.int64) + 3) % 7, "D")
+            edges = np.arange(monday, end + np.timedelta64(7, "D"), np.timedelta64(7, "D"))
+            return edges[:np.searchsorted(edges, end) + 1]
+        if resolution == "monthly":
+            months = np.arange(start.astype("datetime64[M]"),
+                               end.astype("datetime64[M]") + np.timedelta64(2, "M"))
+            edges = months.astype("datetime64[D]")
+            return edges[:np.searchsorted(edges, end) + 1]
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+
+    def series(self, start, end, resolution="daily"):
+        """Per-bucket aggregates between start and end (inclusive dates).
+
+        Returns a dict of equal-length columns; buckets without readings are
+        left out.
+        """
+        # Only the part of the range that has data can produce buckets
+        if len(self.dates):
+            start = max(np.datetime64(start, "D"), self.dates[0])
+            end = min(np.datetime64(end, "D"), self.dates[-1])
+        if not len(self.dates) or start > end:
+            edges = np.array([], dtype="datetime64[D]")
+        else:
+            edges = self.bucket_edges(start, end, resolution)
+        # Weekly/monthly buckets are labelled by their calendar start but only
+        # count readings inside the requested range
+        clipped = np.clip(edges, np.datetime64(start, "D"),
+                          np.datetime64(end, "D") + np.timedelta64(1, "D"))
+        bounds = np.searchsorted(self.dates, clipped)
+        lo, hi = bounds[:-1], bounds[1:]
+        keep = hi > lo
+        lo, hi, labels = lo[keep], hi[keep], edges[:-1][keep]
+
+        counts = hi - lo
+        means = np.round((self.prefix[hi] - self.prefix[lo]) / counts[:, None], DECIMALS)
+        mins, maxs = self._range_extremes(lo, hi)
+        result = {
+            "date": labels.astype(str).tolist(),
+            "count": counts.tolist(),
+            "mean_aqi": means[:, 0],
+            "min_aqi": mins,
+            "max_aqi": maxs,
+        }
+        for i, column in enumerate(self.pollutant_columns, start=1):
+            result[column] = means[:, i]
+        return result
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of threshold points that keep
+    the visual shape of (x, y). Always keeps the first and last point."""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        raise ValueError("LTTB needs a threshold of at least 3 points")
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    bucket_edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = bucket_edges[i], bucket_edges[i + 1]
+        next_lo, next_hi = bucket_edges[i + 1], bucket_edges[i + 2] if i + 2 < len(bucket_edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(series, points):
+    """Reduce a series() result to at most `points` buckets with LTTB on mean AQI"""
+    if points is None or len(series["date"]) <= points:
+        keep = slice(None)
+    else:
+        x = np.array(series["date"], dtype="datetime64[D]").astype(np.float64)
+        keep = lttb_indices(x, np.asarray(series["mean_aqi"]), points)
+    return {key: np.asarray(column)[keep].tolist() for key, column in series.items()}
@@ -0,0 +1,343 @@
+"""Parameterised HTML reports from Updated_Visualization.ipynb.
+
+    report = reports.get_report(month)   # -> Report(html, status, key)
+
+The notebook's `parameters` cell is followed by an injected `month = N`
+cell (papermill's convention) and the notebook runs on a kernel from a small
+pool of pre-started kernels, which are reused between runs. Each run first
+resets the kernel namespace, so no state leaks from one month to the next.
+Imports stay loaded, which is most of what a fresh kernel costs.
+
+Exported HTML is cached on disk under REPORT_CACHE_DIR, keyed by (notebook
+hash, dataset fingerprint, month). Both are content hashes of exactly what a
+run reads: the notebook plus charts.py, which it imports, and
+Final_Dataset.csv; readings posted to /readings go to a separate log the
+notebook does not read, so they do not invalidate reports. The least recently used files are evicted
+once the cache grows past REPORT_CACHE_BYTES. When the notebook or the
+dataset changes, the last report for a month is served as "stale" while a
+fresh one is generated in the background; only a month that has never been
+rendered is generated while the client waits.
+"""
+import os
+import atexit
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import nbformat
+from nbclient import NotebookClient
+from nbconvert import HTMLExporter
+from jupyter_client import KernelManager
+
+from instrumentation import span
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+NOTEBOOK_PATH = os.path.join(base_dir, "Updated_Visualization.ipynb")
+DATASET_PATH = os.path.join(base_dir, "Final_Dataset.csv")
+CHARTS_PATH = os.path.join(base_dir, "charts.py")
+CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "aqi-reports"))
+CACHE_BYTES = int(os.getenv("REPORT_CACHE_BYTES", str(200 * 1024 * 1024)))
+POOL_SIZE = int(os.getenv("REPORT_KERNELS", "1"))
+KERNEL_NAME = os.getenv("REPORT_KERNEL_NAME", "python3")
+CELL_TIMEOUT = int(os.getenv("REPORT_CELL_TIMEOUT", "120"))
+# Restart a kernel after this many runs so leaks in the notebook cannot pile up
+MAX_RUNS_PER_KERNEL = int(os.getenv("REPORT_MAX_RUNS_PER_KERNEL", "50"))
+RESET_SOURCE = "%reset -f\nimport matplotlib.pyplot as plt\nplt.close('all')"
+
+Report = namedtuple("Report", ["html", "status", "key"])
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_digests = {}  # path -> (size, mtime_ns, digest)
+_digests_lock = threading.Lock()
+
+
+def cached_digest(path):
+    """file_digest, recomputed only when the file's size or mtime changes"""
+    st = os.stat(path)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return cached[2]
+    digest = file_digest(path)
+    with _digests_lock:
+        _digests[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def dataset_fingerprint(path=DATASET_PATH):
+    """Changes whenever the CSV's content does; a touched file keeps its reports"""
+    return cached_digest(path)
+
+
+def parameterise(nb, month):
+    """Insert `month = N` after the cell tagged `parameters`"""
+    injected = nbformat.v4.new_code_cell(f"# Parameters\nmonth = {int(month)}",
+                                         metadata={"tags": ["injected-parameters"]})
+    for index, cell in enumerate(nb.cells):
+        if "parameters" in cell.metadata.get("tags", []):
+            nb.cells.insert(index + 1, injected)
+            return nb
+    nb.cells.insert(0, injected)
+    return nb
+
+
+class KernelPool:
+    """Pre-started kernels handed out one run at a time"""
+
+    def __init__(self, size, kernel_name=KERNEL_NAME, cwd=base_dir):
+        self.size = size
+        self.kernel_name = kernel_name
+        self.cwd = cwd
+        self._idle = []
+        self._runs = {}
+        self._cond = threading.Condition()
+        self._started = 0
+
+    def _start_kernel(self):
+        km = KernelManager(kernel_name=self.kernel_name)
+        km.start_kernel(cwd=self.cwd)
+        self._runs[id(km)] = 0
+        return km
+
+    def prestart(self):
+        """Start every kernel now instead of on first use"""
+        kernels = []
+        for _ in range(self.size):
+            kernels.append(self.acquire())
+        for km in kernels:
+            self.release(km)
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            while not self._idle and self._started >= self.size:
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("No report kernel became free in time")
+            if self._idle:
+                km = self._idle.pop()
+            else:
+                self._started += 1
+                km = None
+        if km is None:
+            try:
+                return self._start_kernel()
+            except Exception:
+                with self._cond:
+                    self._started -= 1
+                    self._cond.notify()
+                raise
+        if not km.is_alive() or self._runs.get(id(km), 0) >= MAX_RUNS_PER_KERNEL:
+            self._runs.pop(id(km), None)
+            km.shutdown_kernel(now=True)
+            km = self._start_kernel()
+        return km
+
+    def release(self, km, broken=False):
+        if broken:
+            self._runs.pop(id(km), None)
+            km.shutdown_kernel(now=True)
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._runs[id(km)] = self._runs.get(id(km), 0) + 1
+            self._idle.append(km)
+            self._cond.notify()
+
+    def shutdown(self):
+        with self._cond:
+            kernels, self._idle = self._idle, []
+            self._started -= len(kernels)
+        for km in kernels:
+            km.shutdown_kernel(now=True)
+
+
+class ReportCache:
+    """HTML files on disk, evicted least recently used first past max_bytes"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.html")
+
+    def get(self, key):
+        try:
+            with open(self.path(key), encoding="utf-8") as f:
+                html = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(self.path(key))  # mtime doubles as last use for eviction
+        except OSError:
+            pass
+        return html
+
+    def latest(self, month):
+        """The most recent report for a month under any key, as (key, html)"""
+        suffix = f"-m{month:02d}.html"
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(suffix)]
+        except FileNotFoundError:
+            return None, None
+        for name in sorted(names, key=lambda n: self._mtime(n), reverse=True):
+            key = name[:-len(".html")]
+            html = self.get(key)
+            if html is not None:
+                return key, html
+        return None, None
+
+    def _mtime(self, name):
+        try:
+            return os.path.getmtime(os.path.join(self.directory, name))
+        except OSError:
+            return 0.0
+
+    def put(self, key, html):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".html"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+class ReportService:
+    def __init__(self, notebook_path=NOTEBOOK_PATH, dataset_path=DATASET_PATH,
+                 cache_dir=CACHE_DIR, cache_bytes=CACHE_BYTES, pool_size=POOL_SIZE):
+        self.notebook_path = notebook_path
+        self.dataset_path = dataset_path
+        self.cache = ReportCache(cache_dir, cache_bytes)
+        self.pool = KernelPool(pool_size, cwd=os.path.dirname(notebook_path))
+        self._background = ThreadPoolExecutor(max(pool_size, 1), thread_name_prefix="report")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._exporter = HTMLExporter()
+        self._export_lock = threading.Lock()
+
+    def notebook_hash(self):
+        """The notebook and the chart code it imports"""
+        return hashlib.sha256((cached_digest(self.notebook_path) +
+                               cached_digest(CHARTS_PATH)).encode()).hexdigest()
+
+    def key(self, month):
+        return (f"{self.notebook_hash()[:16]}-{dataset_fingerprint(self.dataset_path)[:16]}"
+                f"-m{month:02d}")
+
+    def render(self, month):
+        """Execute the notebook for a month on a pooled kernel and export HTML"""
+        nb = parameterise(nbformat.read(self.notebook_path, as_version=4), month)
+        reset_cell = nbformat.v4.new_code_cell(RESET_SOURCE)
+        nb.cells.insert(0, reset_cell)
+
+        km = self.pool.acquire(timeout=CELL_TIMEOUT)
+        broken = True
+        try:
+            client = NotebookClient(nb, km=km, timeout=CELL_TIMEOUT, allow_errors=True,
+                                    kernel_name=self.pool.kernel_name,
+                                    resources={"metadata": {"path": os.path.dirname(self.notebook_path)}})
+            with span("notebook_execute"):
+                try:
+                    client.execute()
+                finally:
+                    if client.kc is not None:
+                        client.kc.stop_channels()
+            broken = False
+        finally:
+            self.pool.release(km, broken=broken)
+
+        nb.cells.remove(reset_cell)
+        with span("notebook_export"), self._export_lock:
+            html, _ = self._exporter.from_notebook_node(nb)
+        return html
+
+    def generate(self, month, key=None):
+        key = key or self.key(month)
+        html = self.render(month)
+        self.cache.put(key, html)
+        return Report(html, "generated", key)
+
+    def _regenerate(self, month, key):
+        try:
+            self.generate(month, key)
+        except Exception as e:
+            print(f"Background report generation for month {month} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def refresh_in_background(self, month, key):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._background.submit(self._regenerate, month, key)
+
+    def get_report(self, month):
+        key = self.key(month)
+        html = self.cache.get(key)
+        if html is not None:
+            return Report(html, "hit", key)
+        stale_key, html = self.cache.latest(month)
+        if html is not None:
+            self.refresh_in_background(month, key)
+            return Report(html, "stale", stale_key)
+        return self.generate(month, key)
+
+    def prestart(self):
+        """Start the kernel pool in the background so the first report does not wait"""
+        def start():
+            try:
+                self.pool.prestart()
+            except Exception as e:
+                print(f"Could not start report kernels: {e}")
+        threading.Thread(target=start, name="report-kernels", daemon=True).start()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def service():
+    """The process-wide ReportService, created on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ReportService()
+            atexit.register(_service.pool.shutdown)
+        return _service
+
+
+def get_report(month):
+    return service().get_report(month)
@@ -0,0 +1,28 @@
+import json
+
+from admission import AdmissionController
+
+
+def controller(tmp_path, **config):
+    path = tmp_path / "admission.json"
+    path.write_text(json.dumps(dict(config, store=str(tmp_path / "admission.db"))))
+    return AdmissionController(str(path))
+
+
+def test_disabled_controller_creates_no_store(tmp_path):
+    admission = controller(tmp_path)
+    assert admission.admit("get_aqi", "127.0.0.1") == (None, None)
+    assert not (tmp_path / "admission.db").exists()
+
+
+def test_enabled_controller_sheds_when_the_bucket_is_empty(tmp_path):
+    admission = controller(tmp_path, enabled=True, classes={
+        "db_write": {"rate": 0.001, "burst": 1, "user_rate": 0.001, "user_burst": 1,
+                     "concurrency": 1, "queue_timeout": 0.1}})
+    name, rejection = admission.admit("get_aqi", "127.0.0.1")
+    assert (name, rejection) == ("db_write", None)
+    admission.release(name)
+    assert (tmp_path / "admission.db").exists()
+
+    name, rejection = admission.admit("get_aqi", "127.0.0.1")
+    assert name is None and rejection[1] == 429
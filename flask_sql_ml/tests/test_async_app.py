@@ -0,0 +1,67 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import advice
+import async_app
+import handlers
+import Updated_Visualization as vis
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_app, "pool", async_app.ConnectionPool(str(tmp_path / "users.db"), 2))
+    return async_app.app
+
+
+def run(client, *requests):
+    """Serve requests (method, path, json) in order; returns [(status, json)]"""
+    async def serve():
+        results = []
+        async with client.test_app() as test_app:
+            with sqlite3.connect(async_app.pool.path) as conn:
+                conn.execute("INSERT INTO user (username, password, category) "
+                             "VALUES ('asha', 'x', 'Old Age')")
+            test_client = test_app.test_client()
+            for method, path, body in requests:
+                response = await test_client.open(path, method=method, json=body)
+                results.append((response.status_code, await response.get_json()))
+        return results
+    return asyncio.run(serve())
+
+
+def test_aqi_lookup(client):
+    (ok, body), (bad, error) = run(client, ("GET", "/aqi/3", None), ("GET", "/aqi/13", None))
+    assert (ok, body) == (200, {"month_index": 3, "aqi_value": handlers.month_aqi(3)})
+    assert bad == 400 and "1-12" in error["error"]
+
+
+def test_aqi_without_city_is_the_default_city(client):
+    (_, default), (_, named) = run(client, ("GET", "/aqi/3", None),
+                                   ("GET", f"/aqi/3?city={vis.DEFAULT_CITY}", None))
+    assert default == named
+
+
+def test_unknown_city_is_404(client):
+    (aqi, body), (predict, _), (charts, _) = run(
+        client,
+        ("GET", "/aqi/3?city=atlantis", None),
+        ("POST", "/predict/3", {"username": "asha", "city": "atlantis"}),
+        ("POST", "/run-notebook", {"month": 3, "city": "atlantis"}))
+    assert (aqi, predict, charts) == (404, 404, 404)
+    assert body == {"error": "Unknown city: atlantis"}
+
+
+def test_predict_is_recorded_in_history(client):
+    (status, body), _, (_, history), (unknown, _) = run(
+        client,
+        ("POST", "/predict/1", {"username": "asha"}),
+        ("POST", "/predict/2", {"username": "asha"}),
+        ("POST", "/history", {"username": "asha"}),
+        ("POST", "/predict/1", {"username": "nobody"}))
+    assert status == 200
+    assert body["aqi_value"] == handlers.month_aqi(1)
+    assert body["solution"] == advice.solutions_for(body["aqi_value"])["Old Age"]
+    assert [h["month_index"] for h in history["history"]] == [2, 1]
+    assert unknown == 401
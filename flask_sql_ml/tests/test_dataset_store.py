@@ -0,0 +1,96 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import POLLUTANT_COLUMNS, DatasetStore, RollingStats, RunningMean
+
+
+def readings(n=500, seed=1):
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 900, n), unit="D")
+    frame = pd.DataFrame(rng.uniform(0, 300, size=(n, len(POLLUTANT_COLUMNS))), columns=POLLUTANT_COLUMNS)
+    frame.insert(0, "Date", days.strftime("%Y-%m-%d"))
+    frame.insert(1, "year", days.year)
+    frame.insert(2, "month", days.month)
+    frame["AQI"] = frame[POLLUTANT_COLUMNS].max(axis=1)
+    return frame
+
+
+def fold(frame):
+    stats = RollingStats()
+    for row in frame.to_dict("records"):
+        stats.update(datetime.date.fromisoformat(row["Date"]), row["year"], row["month"],
+                     row["AQI"], np.array([row[c] for c in POLLUTANT_COLUMNS]))
+    return stats
+
+
+def test_running_mean_matches_numpy():
+    values = np.random.default_rng(0).normal(100, 30, size=1000)
+    stats = RunningMean()
+    for value in values:
+        stats.update(value)
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.variance == pytest.approx(values.var(ddof=1))
+
+
+def test_running_mean_single_value():
+    stats = RunningMean()
+    stats.update(5.0)
+    assert (stats.mean, stats.variance) == (5.0, 0.0)
+
+
+def test_rolling_stats_match_pandas():
+    # Readings arrive out of date order, as they do from the append log
+    frame = readings()
+    stats = fold(frame)
+
+    for month in range(1, 13):
+        expected = frame[frame["month"] == month].groupby("year")["AQI"].mean()
+        np.testing.assert_allclose(stats.yearly_means(month).to_numpy(), expected.to_numpy())
+        assert stats.yearly_means(month).index.tolist() == expected.index.tolist()
+        totals = frame.loc[frame["month"] == month, POLLUTANT_COLUMNS].sum()
+        np.testing.assert_allclose(stats.pollutant_totals(month).to_numpy(), totals.to_numpy())
+
+    dates = pd.to_datetime(frame["Date"])
+    for days in (7, 30):
+        window = frame[dates > dates.max() - pd.Timedelta(days=days)]
+        assert stats.rolling_mean(days) == pytest.approx(window["AQI"].mean())
+
+
+def test_store_reads_other_workers_appends(tmp_path):
+    base = readings(50)
+    base.to_csv(tmp_path / "data.csv")
+    log = tmp_path / "readings.csv"
+    writer = DatasetStore(str(tmp_path / "data.csv"), str(log))
+    reader = DatasetStore(str(tmp_path / "data.csv"), str(log))
+    assert reader.summary()["readings"] == 50
+
+    new = {"Date": "2025-01-02", **{c: 10.0 for c in POLLUTANT_COLUMNS}}
+    assert writer.append([new, dict(new, Date="2025-01-03")]) == 2
+    assert reader.summary()["readings"] == 52
+    frame = reader.frame()
+    assert frame["Unnamed: 0"].tolist()[-2:] == [50, 51]
+    assert reader.yearly_means(1).loc[2025] == 10.0
+
+
+def test_append_rejects_missing_sub_index(tmp_path):
+    readings(10).to_csv(tmp_path / "data.csv")
+    store = DatasetStore(str(tmp_path / "data.csv"), str(tmp_path / "readings.csv"))
+    reading = {"Date": "2025-01-02", **{c: 10.0 for c in POLLUTANT_COLUMNS[1:]}}
+    with pytest.raises(ValueError, match=f"Missing {POLLUTANT_COLUMNS[0]}"):
+        store.append([reading])
+    assert not (tmp_path / "readings.csv").exists()
+
+
+def test_append_rejects_future_dates(tmp_path):
+    readings(10).to_csv(tmp_path / "data.csv")
+    store = DatasetStore(str(tmp_path / "data.csv"), str(tmp_path / "readings.csv"))
+    today = datetime.date.today()
+    reading = {c: 10.0 for c in POLLUTANT_COLUMNS}
+    with pytest.raises(ValueError, match="in the future"):
+        store.append([dict(reading, Date=(today + datetime.timedelta(days=2)).isoformat())])
+    # A reporting station a timezone ahead may already be on tomorrow
+    assert store.append([dict(reading, Date=(today + datetime.timedelta(days=1)).isoformat())]) == 1
@@ -0,0 +1,174 @@
+import threading
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+import ensemble
+from model_registry import LoadedModel, tree_predictions
+
+FEATURES = ["a", "b", "c"]
+
+
+class StubRegistry:
+    def __init__(self, model, mse):
+        self.loaded = LoadedModel("v0001", model, FEATURES, {"metrics": {"mse": mse}}, {}, None)
+
+    def current(self):
+        return self.loaded
+
+
+class Constant:
+    """A member that disagrees with the forest by a fixed amount"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full(len(X), self.value)
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, size=(300, len(FEATURES)))
+    y = X @ np.array([1.5, -0.5, 0.2]) + rng.normal(0, 5, size=len(X))
+    rows = [dict(zip(FEATURES, x)) for x in X[:50]]
+    return X, y, rows
+
+
+@pytest.fixture(scope="module")
+def forest(data):
+    X, y, _ = data
+    return RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+
+
+def assert_band_contains_point(result):
+    if result["band_source"] == "unavailable":  # only the non-forest member made the budget
+        assert result["band"] is None
+        return
+    for p in result["predictions"]:
+        assert p["lower"] <= p["aqi"] <= p["upper"]
+
+
+class Gated:
+    """A member whose first predict blocks until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        if self.calls == 1:
+            self.started.set()
+            self.release.wait(5)
+        return np.zeros(len(X))
+
+
+def test_tree_predictions_match_forest(data, forest):
+    X, _, _ = data
+    trees = tree_predictions(forest, X[:10])
+    assert trees.shape == (20, 10)
+    np.testing.assert_allclose(trees.mean(axis=0), forest.predict(X[:10]), rtol=1e-6)
+
+
+@pytest.mark.parametrize("budget_ms", [None, 0.001])
+def test_band_contains_point(data, forest, budget_ms):
+    X, y, rows = data
+    members = {"rf": StubRegistry(forest, 25.0),
+               "lr": StubRegistry(LinearRegression().fit(X, y), 30.0)}
+    result = ensemble.Ensemble(members, budget_ms=budget_ms).predict(rows)
+    assert_band_contains_point(result)
+
+
+def test_band_covers_member_disagreement(data, forest):
+    _, _, rows = data
+    members = {"rf": StubRegistry(forest, 1.0), "far": StubRegistry(Constant(10_000.0), 1.0)}
+    result = ensemble.Ensemble(members).predict(rows)
+    assert_band_contains_point(result)
+    for p in result["predictions"]:
+        assert p["upper"] >= 10_000.0
+
+
+def test_band_without_forest_or_spread(data):
+    _, _, rows = data
+    members = {"x": StubRegistry(Constant(42.0), 1.0), "y": StubRegistry(Constant(42.0), 1.0)}
+    result = ensemble.Ensemble(members).predict(rows)
+    assert result["band"]["source"] is None
+    for p in result["predictions"]:
+        assert p["lower"] == p["aqi"] == p["upper"] == 42.0
+
+
+def test_skewed_forest_band():
+    # One outlying tree drags the forest's mean above its 95th percentile
+    trees = np.array([[0.0]] * 99 + [[1000.0]])
+    centre = trees.mean(axis=0)
+    lower, upper = ensemble.band(centre, centre[None, :], trees, centre)
+    assert lower[0] <= centre[0] <= upper[0]
+
+
+def test_single_member_without_forest_has_no_band(data):
+    _, _, rows = data
+    result = ensemble.Ensemble({"x": StubRegistry(Constant(42.0), 1.0)}).predict(rows)
+    assert result["band"] is None and result["band_source"] == "unavailable"
+    assert all(p["lower"] is None and p["upper"] is None for p in result["predictions"])
+
+
+def test_single_forest_keeps_tree_band(data, forest):
+    _, _, rows = data
+    result = ensemble.Ensemble({"rf": StubRegistry(forest, 1.0)}).predict(rows)
+    assert result["band_source"] == "rf"
+    assert_band_contains_point(result)
+
+
+def test_members_score_through_loaded_model(data, forest):
+    _, _, rows = data
+    calls = []
+
+    class Recording(LoadedModel):
+        def predict(self, rows):
+            calls.append("predict")
+            return super().predict(rows)
+
+        def predict_trees(self, rows):
+            calls.append("predict_trees")
+            return super().predict_trees(rows)
+
+    members = {}
+    for name, model in (("rf", forest), ("x", Constant(1.0))):
+        members[name] = StubRegistry(model, 1.0)
+        members[name].loaded = Recording("v0001", model, FEATURES, {}, {}, None)
+    ensemble.Ensemble(members).predict(rows)
+    assert sorted(calls) == ["predict", "predict_trees"]
+
+
+def test_busy_member_is_not_resubmitted(data):
+    _, _, rows = data
+    gated = Gated()
+    members = {"fast": StubRegistry(Constant(1.0), 1.0), "slow": StubRegistry(gated, 1.0)}
+    scorer = ensemble.Ensemble(members, budget_ms=20)
+    try:
+        assert scorer.predict(rows)["members"]["slow"]["status"] == "skipped"
+        second = scorer.predict(rows)
+        assert second["members"]["slow"]["status"] == "skipped"
+        assert gated.calls == 1  # still on the first batch, not queued again
+    finally:
+        gated.release.set()
+
+
+def test_every_member_busy_scores_on_calling_thread(data):
+    _, _, rows = data
+    gated = Gated()
+    scorer = ensemble.Ensemble({"slow": StubRegistry(gated, 1.0)})
+    first = threading.Thread(target=scorer.predict, args=(rows,))
+    first.start()
+    try:
+        assert gated.started.wait(5)
+        result = scorer.predict(rows)
+        assert result["members"]["slow"]["status"] == "ok" and gated.calls == 2
+    finally:
+        gated.release.set()
+        first.join(5)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import features
+
+
+def frame(rows=40):
+    values = np.random.default_rng(0).uniform(0, 300, size=(rows, len(features.POLLUTANTS)))
+    return pd.DataFrame(values, columns=features.POLLUTANTS,
+                        index=pd.date_range("2024-01-01", periods=rows, name="date"))
+
+
+def test_lag_frame_matches_notebook_shift():
+    data = frame()
+    expected = data.copy()
+    for col in features.POLLUTANTS:
+        for lag in range(1, 8):
+            expected[f'{col}_lag{lag}'] = expected[col].shift(lag)
+    expected = expected.drop(columns=features.POLLUTANTS).dropna()
+
+    lags = features.lag_frame(features.to_buffer(data, dtype=np.float64), 7, index=data.index)
+    pd.testing.assert_frame_equal(lags, expected)
+
+
+def test_sliding_windows_match_create_sequences():
+    buffer = features.to_buffer(frame())
+    target = np.arange(len(buffer), dtype=np.float32).reshape(-1, 1)
+    X, y = [], []
+    for i in range(len(buffer) - 24):
+        X.append(buffer[i:i + 24, :])
+        y.append(target[i + 24])
+
+    windows, labels = features.sliding_windows(buffer, target, 24)
+    np.testing.assert_array_equal(windows, np.array(X))
+    np.testing.assert_array_equal(labels, np.array(y))
+
+
+def test_online_window_matches_np_roll_forecast_loop():
+    buffer = features.to_buffer(frame())
+    latest_sequence = buffer[-24:].copy()
+    online = features.OnlineWindow.from_buffer(buffer, 24)
+    for step in range(30):
+        next_pred = float(step)
+        latest_sequence = np.roll(latest_sequence, -1, axis=0)
+        latest_sequence[-1] = next_pred
+        online.append(np.full(len(features.POLLUTANTS), next_pred))
+        np.testing.assert_array_equal(online.window(), latest_sequence)
+    np.testing.assert_array_equal(online.lags(3), latest_sequence[:-4:-1].T)
@@ -0,0 +1,24 @@
+import os
+import runpy
+import types
+
+import instrumentation
+
+
+def test_exited_worker_snapshot_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, "_multiproc_dir", str(tmp_path))
+    monkeypatch.setattr(instrumentation, "_snapshot_file", (None, None))
+    instrumentation.observe(instrumentation.PHASE_METRIC, (("phase", "test"),), 0.01)
+    instrumentation.flush()
+    # A dead worker that had this pid earlier, and another live worker
+    stale = tmp_path / f"metrics_{os.getpid()}_1.json"
+    stale.write_text("[]")
+    other = tmp_path / "metrics_1_1.json"
+    other.write_text("[]")
+
+    names = os.listdir(tmp_path)
+    assert len([n for n in names if n.startswith(f"metrics_{os.getpid()}_")]) == 2
+
+    config = runpy.run_path(os.path.join(os.path.dirname(instrumentation.__file__), "gunicorn.conf.py"))
+    config["child_exit"](None, types.SimpleNamespace(pid=os.getpid()))
+    assert os.listdir(tmp_path) == ["metrics_1_1.json"]
@@ -0,0 +1,74 @@
+import os
+import pickle
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+from model_registry import DEFAULT_FEATURES, ModelRegistry, list_versions, publish
+
+
+def artifact(tmp_path, offset):
+    X = np.random.default_rng(0).uniform(0, 100, size=(50, len(DEFAULT_FEATURES)))
+    model = LinearRegression().fit(X, X.sum(axis=1) + offset)
+    path = tmp_path / f"model_{offset}.pkl"
+    with open(path, "wb") as f:
+        pickle.dump(model, f)
+    return str(path)
+
+
+def test_publish_numbers_versions_and_ignores_other_entries(tmp_path):
+    registry_dir = str(tmp_path / "registry")
+    assert publish(artifact(tmp_path, 0), registry_dir) == "v0001"
+    os.makedirs(os.path.join(registry_dir, "rf", "notes"))
+    os.makedirs(os.path.join(registry_dir, "rf", "v0001.bak"))
+    assert publish(artifact(tmp_path, 1), registry_dir) == "v0002"
+    assert list_versions(registry_dir, "rf") == ["v0001", "v0002"]
+
+
+def test_checksum_mismatch_keeps_previous_version(tmp_path):
+    registry_dir = str(tmp_path / "registry")
+    publish(artifact(tmp_path, 0), registry_dir)
+    registry = ModelRegistry(registry_dir, poll_interval=0)
+    assert registry.current().version == "v0001"
+
+    version = publish(artifact(tmp_path, 1), registry_dir)
+    with open(os.path.join(registry_dir, "rf", version, "model_1.pkl"), "ab") as f:
+        f.write(b"corrupt")
+    assert registry.refresh() is False
+    assert registry.current().version == "v0001"
+    status = registry.status()
+    assert "checksum mismatch" in status["failed_versions"]["v0002"]
+
+    # status() hands out a copy, not the registry's own record
+    status["failed_versions"].clear()
+    assert "v0002" in registry.status()["failed_versions"]
+
+    # A good version published after the broken one goes live
+    publish(artifact(tmp_path, 2), registry_dir)
+    assert registry.refresh() is True
+    assert registry.current().version == "v0003"
+    assert registry.current().predict([[1.0] * len(DEFAULT_FEATURES)])[0] > 0
+
+
+def test_broken_legacy_model_is_not_retried_until_replaced(tmp_path):
+    legacy = tmp_path / "model.pkl"
+    legacy.write_bytes(b"not a pickle")
+    registry = ModelRegistry(str(tmp_path / "registry"), legacy_path=str(legacy), poll_interval=0)
+    assert registry.current() is None
+    assert "legacy" in registry.status()["failed_versions"]
+    assert registry.refresh() is False
+
+    os.replace(artifact(tmp_path, 0), legacy)
+    assert registry.refresh() is True
+    assert registry.current().version == "legacy"
+
+
+def test_watcher_does_the_first_load(tmp_path):
+    registry_dir = str(tmp_path / "registry")
+    publish(artifact(tmp_path, 0), registry_dir)
+    registry = ModelRegistry(registry_dir, poll_interval=60)
+    try:
+        assert registry.current().version == "v0001"
+        assert registry._watcher.is_alive()
+    finally:
+        registry.stop()
@@ -0,0 +1,26 @@
+import pytest
+
+from partitioned_store import PartitionedStore, UnknownCity, import_frame
+from test_dataset_store import readings
+
+
+def test_city_view_matches_pandas(tmp_path):
+    frame = readings()
+    import_frame(frame, str(tmp_path), "Pune", fmt="csv")
+    store = PartitionedStore(str(tmp_path))
+    view = store.view("pune")
+    assert store.cities() == ["pune"]
+    assert view.describe()["rows"] == len(frame)
+
+    expected = frame[frame["month"] == 3].groupby("year")["AQI"].mean()
+    assert view.yearly_means(3).tolist() == pytest.approx(expected.tolist())
+    assert view.yearly_means(3).index.tolist() == expected.index.tolist()
+
+
+def test_registered_city_and_unknown_city(tmp_path):
+    store = PartitionedStore(str(tmp_path))
+    dataset = object()
+    store.register("Delhi", dataset)
+    assert store.view("delhi") is dataset
+    with pytest.raises(UnknownCity):
+        store.view("atlantis")
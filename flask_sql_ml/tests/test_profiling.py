@@ -0,0 +1,45 @@
+import os
+
+from flask import Flask
+
+import profiling
+
+
+def profiled_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_config", dict(profiling.DEFAULT_CONFIG, enabled=True,
+                                                   sample_rate=1.0, mode="cprofile"))
+    monkeypatch.setattr(profiling, "_active", True)
+    monkeypatch.setattr(profiling, "_cprofile_stats", None)
+    monkeypatch.setattr(profiling, "_start_background", lambda: None)
+    app = Flask(__name__)
+    app.before_request(profiling._before_request)
+    app.teardown_request(profiling._teardown_request)
+    app.add_url_rule("/", "index", lambda: "ok")
+    return app
+
+
+def test_cprofile_skips_requests_while_another_is_profiled(monkeypatch, tmp_path):
+    app = profiled_app(monkeypatch, tmp_path)
+    client = app.test_client()
+
+    with profiling._cprofile_lock:
+        assert client.get("/").status_code == 200
+    assert profiling._cprofile_stats is None
+
+    assert client.get("/").status_code == 200
+    assert profiling._cprofile_stats is not None
+    assert not profiling._cprofile_lock.locked()
+
+
+def test_background_thread_starts_once_per_process(monkeypatch):
+    started = []
+    monkeypatch.setattr(profiling, "_background_pid", None)
+    monkeypatch.setattr(profiling, "_background", lambda: started.append(os.getpid()))
+    profiling._start_background()
+    profiling._start_background()
+    assert profiling._background_pid == os.getpid()
+    for thread in profiling.threading.enumerate():
+        if thread.name == "profiling":
+            thread.join()
+    assert started == [os.getpid()]
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from range_queries import RangeAggregates
+
+POLLUTANTS = ["PM2.5_AQI", "PM10_AQI"]
+
+
+def frame(start="2023-01-01", days=400, seed=2):
+    rng = np.random.default_rng(seed)
+    n = days * 2
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, n), unit="D")
+    df = pd.DataFrame(rng.uniform(0, 300, size=(n, len(POLLUTANTS))), columns=POLLUTANTS)
+    df["Date"] = dates.strftime("%Y-%m-%d")
+    df["AQI"] = rng.uniform(0, 500, n)
+    return df
+
+
+def expected(df, start, end, key):
+    dates = pd.to_datetime(df["Date"])
+    selected = df[(dates >= start) & (dates <= end)].assign(bucket=key(dates))
+    grouped = selected.groupby("bucket")
+    return pd.DataFrame({
+        "count": grouped["AQI"].count(),
+        "mean_aqi": grouped["AQI"].mean(),
+        "min_aqi": grouped["AQI"].min(),
+        "max_aqi": grouped["AQI"].max(),
+        **{c: grouped[c].mean() for c in POLLUTANTS},
+    })
+
+
+def check(result, want):
+    assert result["count"] == want["count"].tolist()
+    for column in ["mean_aqi", "min_aqi", "max_aqi"] + POLLUTANTS:
+        np.testing.assert_allclose(result[column], want[column].to_numpy(), atol=1e-6)
+
+
+@pytest.mark.parametrize("start,end", [("2023-01-01", "2024-12-31"), ("2023-03-17", "2023-09-02")])
+def test_daily_matches_groupby(start, end):
+    df = frame()
+    result = RangeAggregates(df, POLLUTANTS).series(start, end, "daily")
+    want = expected(df, start, end, lambda d: d.dt.strftime("%Y-%m-%d"))
+    assert result["date"] == want.index.tolist()
+    check(result, want)
+
+
+def test_monthly_matches_groupby():
+    df = frame()
+    start, end = "2023-02-10", "2023-11-20"
+    result = RangeAggregates(df, POLLUTANTS).series(start, end, "monthly")
+    want = expected(df, start, end, lambda d: d.dt.strftime("%Y-%m-01"))
+    assert result["date"] == want.index.tolist()
+    check(result, want)
+
+
+def test_weekly_matches_groupby():
+    df = frame()
+    start, end = "2023-02-10", "2023-06-20"
+    result = RangeAggregates(df, POLLUTANTS).series(start, end, "weekly")
+    monday = lambda d: (d - pd.to_timedelta(d.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d")
+    want = expected(df, start, end, monday)
+    assert result["date"] == want.index.tolist()
+    check(result, want)
+
+
+def test_range_outside_data_is_empty():
+    index = RangeAggregates(frame(), POLLUTANTS)
+    assert index.series("1990-01-01", "1990-12-31")["count"] == []
+    # A far-off end is clipped to the data, not expanded into buckets
+    assert len(index.series("2023-01-01", "9999-12-31", "daily")["date"]) <= 400
+
+
+def test_extended_equals_rebuild():
+    df = frame().sort_values("Date", kind="stable")
+    head, tail = df.iloc[:500], df.iloc[500:]
+    extended = RangeAggregates(head, POLLUTANTS)
+    for chunk in np.array_split(np.arange(len(tail)), 7):
+        extended = extended.extended(tail.iloc[chunk])
+    rebuilt = RangeAggregates(df, POLLUTANTS)
+    for resolution in ("daily", "weekly", "monthly"):
+        a = extended.series("2023-01-01", "2024-12-31", resolution)
+        b = rebuilt.series("2023-01-01", "2024-12-31", resolution)
+        assert a["date"] == b["date"] and a["count"] == b["count"]
+        for column in ["mean_aqi", "min_aqi", "max_aqi"] + POLLUTANTS:
+            np.testing.assert_array_equal(a[column], b[column])
+
+
+def test_extended_rejects_earlier_rows():
+    df = frame().sort_values("Date", kind="stable")
+    index = RangeAggregates(df.iloc[100:], POLLUTANTS)
+    assert index.extended(df.iloc[:1]) is None
@@ -0,0 +1,81 @@
+import datetime
+import gzip
+
+import numpy as np
+import pytest
+from flask import Flask, jsonify
+
+import compression
+import fast_json
+
+
+def make_app(provider="json"):
+    app = Flask(__name__)
+    fast_json.init_app(app, provider)
+    compression.init_app(app)
+    app.add_url_rule("/small", "small", lambda: jsonify({"aqi": 300}))
+    app.add_url_rule("/big", "big", lambda: jsonify({"values": list(range(2000))}))
+    # Named like a cached endpoint of the real app
+    app.add_url_rule("/series", "get_series", lambda: jsonify({"series": list(range(2000))}))
+    return app
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("br;q=1.0, gzip;q=0.5", "br"),
+    ("br;q=0.2, gzip;q=0.8", "gzip"),
+    ("gzip;q=0, *;q=0.1", "br"),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert compression.choose_encoding(header, ("br", "gzip")) == expected
+
+
+def test_only_large_responses_are_compressed():
+    client = make_app().test_client()
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert small.headers["Vary"] == "Accept-Encoding"
+
+    big = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert big.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(big.data) == client.get("/big").data
+
+    assert "Content-Encoding" not in client.get("/big").headers
+
+
+def test_cached_endpoint_hits_the_lru(monkeypatch):
+    monkeypatch.setattr(compression, "cache", compression.CompressedCache(1 << 20))
+    client = make_app().test_client()
+    first = client.get("/series", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/series", headers={"Accept-Encoding": "gzip"})
+    assert first.data == second.data
+    assert compression.cache.stats()["hits"] == 1
+    assert compression.cache.stats()["misses"] == 1
+
+    client.get("/big", headers={"Accept-Encoding": "gzip"})  # not a cached endpoint
+    assert compression.cache.stats()["entries"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = compression.CompressedCache(max_bytes=100)
+    bodies = [bytes(np.random.default_rng(i).integers(0, 255, 60, dtype=np.uint8)) for i in range(3)]
+    for body in bodies:
+        cache.get_or_compress(body, "gzip")
+    assert cache.stats()["entries"] == 1 and cache.size <= 100
+
+
+@pytest.mark.skipif(fast_json.orjson is None, reason="orjson not installed")
+def test_orjson_provider_matches_flask_output():
+    payload = {"b": [1, 2.5, None], "a": {"z": "x", "y": True},
+               "when": datetime.datetime(2024, 1, 2, 3, 4, 5)}
+    stdlib = make_app("json").test_client()
+    fast = make_app("orjson").test_client()
+    for app in (stdlib.application, fast.application):
+        app.add_url_rule("/payload", "payload", lambda: jsonify(payload))
+    body = fast.get("/payload").get_data(as_text=True)
+    assert fast.get("/payload").get_json() == stdlib.get("/payload").get_json()
+    assert body.index('"a"') < body.index('"b"') < body.index('"when"')  # sorted keys
+    with fast.application.app_context():
+        assert jsonify({"v": np.float32(1.5)}).get_json() == {"v": 1.5}
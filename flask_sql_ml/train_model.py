@@ -0,0 +1,252 @@
+"""Train the Random Forest AQI model from the local dataset.
+
+Reproduces the preprocessing and GridSearchCV from
+models/Random_forest_AQI (1).ipynb, but fits every (parameters, fold) pair
+in parallel across all cores and caches each finished fold on disk, so an
+interrupted search picks up where it stopped.
+
+    python train_model.py                      # writes rf_model.pkl + training_report.json
+    python train_model.py --publish            # also publishes to model_registry/
+    python train_model.py --xgboost --publish  # also trains and publishes XGBoost ("xgb")
+
+The XGBoost model uses the notebook's hyperparameters (models/XGBoost.ipynb)
+but the Random Forest's six features and split, so the two can be served
+side by side as an ensemble. Both are fitted from one float32 feature buffer
+built by features.to_buffer, the dtype the tree code works in, so neither
+the grid search nor XGBoost makes its own converted copy.
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import itertools
+import datetime
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from sklearn.model_selection import KFold, train_test_split
+
+try:
+    from xgboost import XGBRegressor
+except ImportError:  # optional; only needed for --xgboost
+    XGBRegressor = None
+
+import features
+import model_registry
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(base_dir, "Updated_Dataset_with_AQI (1).csv")
+DEFAULT_CACHE_DIR = os.path.join(base_dir, ".train_cache")
+
+FEATURES = ['o3', 'pm25', 'pm10', 'no2', 'so2', 'co']
+TARGET = 'AQI'
+PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 5, 10, 20],
+    'min_samples_split': [2, 5, 10]
+}
+XGB_PARAMS = {'n_estimators': 200, 'learning_rate': 0.1, 'max_depth': 5}
+
+
+def load_dataset(path):
+    """Load and clean the dataset the same way the notebook does"""
+    raw = pd.read_csv(path, index_col=0)
+    data = raw[['date'] + FEATURES + [TARGET]].copy()
+    data = data.replace(to_replace=" ", value=np.nan)
+    data[FEATURES + [TARGET]] = data[FEATURES + [TARGET]].apply(pd.to_numeric)
+    data = data.fillna(data[FEATURES + [TARGET]].mean())
+    return data[FEATURES], data[TARGET]
+
+
+def expand_grid(param_grid):
+    keys = sorted(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def fold_key(fingerprint, params, fold, n_splits, random_state):
+    payload = json.dumps({
+        "dataset": fingerprint,
+        "params": params,
+        "fold": fold,
+        "n_splits": n_splits,
+        "random_state": random_state,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fit_fold(X, y, train_idx, test_idx, params, random_state, cache_path):
+    """Fit one candidate on one fold and persist the score before returning"""
+    start = time.perf_counter()
+    model = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    model.fit(X[train_idx], y[train_idx])
+    mse = mean_squared_error(y[test_idx], model.predict(X[test_idx]))
+    result = {"mse": float(mse), "fit_seconds": time.perf_counter() - start}
+
+    # Write-then-rename so an interrupt never leaves a truncated cache entry
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, cache_path)
+    return result
+
+
+def grid_search(X, y, param_grid, fingerprint, cache_dir, n_splits=5,
+                random_state=42, n_jobs=-1):
+    """Cross-validated grid search with one cache file per (candidate, fold).
+
+    Returns (cv_results, cache_hits); cv_results is sorted best first.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    folds = list(KFold(n_splits=n_splits).split(X))
+    candidates = expand_grid(param_grid)
+
+    scores = {}
+    pending = []
+    for ci, params in enumerate(candidates):
+        for fold, (train_idx, test_idx) in enumerate(folds):
+            cache_path = os.path.join(
+                cache_dir, fold_key(fingerprint, params, fold, n_splits, random_state) + ".json")
+            if os.path.exists(cache_path):
+                with open(cache_path) as f:
+                    scores[(ci, fold)] = json.load(f)
+            else:
+                pending.append((ci, fold, train_idx, test_idx, params, cache_path))
+
+    cache_hits = len(scores)
+    print(f"Grid search: {len(candidates)} candidates x {n_splits} folds, "
+          f"{cache_hits} cached, {len(pending)} to fit")
+
+    results = Parallel(n_jobs=n_jobs, verbose=5 if pending else 0)(
+        delayed(fit_fold)(X, y, train_idx, test_idx, params, random_state, cache_path)
+        for _, _, train_idx, test_idx, params, cache_path in pending
+    )
+    for (ci, fold, *_), result in zip(pending, results):
+        scores[(ci, fold)] = result
+
+    cv_results = []
+    for ci, params in enumerate(candidates):
+        fold_mse = [scores[(ci, fold)]["mse"] for fold in range(n_splits)]
+        cv_results.append({
+            "params": params,
+            "mean_mse": float(np.mean(fold_mse)),
+            "std_mse": float(np.std(fold_mse)),
+            "fit_seconds": float(sum(scores[(ci, fold)]["fit_seconds"] for fold in range(n_splits))),
+        })
+    cv_results.sort(key=lambda r: r["mean_mse"])
+    return cv_results, cache_hits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the Random Forest AQI model")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--output", default=os.path.join(base_dir, "rf_model.pkl"))
+    parser.add_argument("--report", default=os.path.join(base_dir, "training_report.json"))
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="worker processes (-1 = all cores)")
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--publish", action="store_true",
+                        help="publish the trained model to the model registry")
+    parser.add_argument("--registry-dir", default=model_registry.DEFAULT_REGISTRY_DIR)
+    parser.add_argument("--xgboost", action="store_true",
+                        help="also train an XGBoost model on the same features")
+    parser.add_argument("--xgb-output", default=os.path.join(base_dir, "xgb_model.pkl"))
+    args = parser.parse_args(argv)
+    if args.xgboost and XGBRegressor is None:
+        parser.error("--xgboost needs the xgboost package")
+
+    timings = {}
+    start = time.perf_counter()
+    fingerprint = model_registry.file_sha256(args.dataset)
+    X, y = load_dataset(args.dataset)
+    X = features.to_buffer(X, FEATURES)
+    y = y.to_numpy(dtype=np.float64)
+    train_X, val_X, train_Y, val_Y = train_test_split(X, y, test_size=0.2,
+                                                      random_state=args.random_state)
+    timings["load_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cv_results, cache_hits = grid_search(train_X, train_Y, PARAM_GRID, fingerprint,
+                                         args.cache_dir, n_splits=args.cv,
+                                         random_state=args.random_state, n_jobs=args.n_jobs)
+    timings["search_seconds"] = time.perf_counter() - start
+    best_params = cv_results[0]["params"]
+    print(f"Best Hyperparameters Found: {best_params}")
+
+    start = time.perf_counter()
+    best_rf = RandomForestRegressor(random_state=args.random_state, n_jobs=args.n_jobs, **best_params)
+    best_rf.fit(train_X, train_Y)
+    best_rf.set_params(n_jobs=None)  # serve single-threaded; workers already run in parallel
+    timings["refit_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = best_rf.predict(val_X)
+    metrics = {
+        "mse": float(mean_squared_error(val_Y, y_pred)),
+        "mae": float(mean_absolute_error(val_Y, y_pred)),
+        "r2": float(r2_score(val_Y, y_pred)),
+    }
+    timings["evaluate_seconds"] = time.perf_counter() - start
+    print(f"Tuned Model Performance: MSE {metrics['mse']:.2f}, R² {metrics['r2']:.2f}")
+
+    with open(args.output, "wb") as f:
+        pickle.dump(best_rf, f)
+
+    report = {
+        "created": datetime.datetime.utcnow().isoformat(),
+        "dataset": os.path.basename(args.dataset),
+        "dataset_sha256": fingerprint,
+        "rows": int(len(X)),
+        "features": FEATURES,
+        "best_params": best_params,
+        "validation": metrics,
+        "cv_results": cv_results,
+        "cache_hits": cache_hits,
+        "timings": timings,
+        "n_jobs": args.n_jobs,
+        "cpu_count": os.cpu_count(),
+    }
+    if args.publish:
+        report["registry_version"] = model_registry.publish(
+            args.output, registry_dir=args.registry_dir, name="rf", features=FEATURES,
+            metrics=metrics, smoke_input=[float(v) for v in val_X[0]])
+        print(f"Published model version {report['registry_version']}")
+
+    if args.xgboost:
+        start = time.perf_counter()
+        xgb = XGBRegressor(random_state=args.random_state, n_jobs=args.n_jobs, **XGB_PARAMS)
+        xgb.fit(train_X, train_Y)
+        xgb.set_params(n_jobs=1)  # the ensemble runs members on their own threads
+        timings["xgb_fit_seconds"] = time.perf_counter() - start
+        xgb_pred = xgb.predict(val_X)
+        xgb_metrics = {
+            "mse": float(mean_squared_error(val_Y, xgb_pred)),
+            "mae": float(mean_absolute_error(val_Y, xgb_pred)),
+            "r2": float(r2_score(val_Y, xgb_pred)),
+        }
+        print(f"XGBoost Performance: MSE {xgb_metrics['mse']:.2f}, R² {xgb_metrics['r2']:.2f}")
+        with open(args.xgb_output, "wb") as f:
+            pickle.dump(xgb, f)
+        report["xgboost"] = {"params": XGB_PARAMS, "validation": xgb_metrics}
+        if args.publish:
+            report["xgboost"]["registry_version"] = model_registry.publish(
+                args.xgb_output, registry_dir=args.registry_dir, name="xgb", features=FEATURES,
+                metrics=xgb_metrics, smoke_input=[float(v) for v in val_X[0]])
+            print(f"Published XGBoost version {report['xgboost']['registry_version']}")
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output} and {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())